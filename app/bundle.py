@@ -0,0 +1,388 @@
+# Loading of the title catalog and the data bundle, independent of the Streamlit page
+import ast
+import hashlib
+import re
+from collections import ChainMap
+from os import path
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from catalog import write_catalog, extend_catalog, open_catalog, latest_catalog, layout_report, catalog_versions, \
+    collect_catalogs, catalog_manifest
+from query import catalog_index, best_rows, select_titles
+from render import render_landing
+from trends import load_trends
+from scoring import Embeddings, TopicSearch, embed_titles, titles_key, embedding_manifest
+
+data_dir = path.join("..", "data")
+score_dir = path.join(data_dir, "score_data")
+embedding_dir = path.join(data_dir, "embedding")  # word vectors from scoring.py convert, enables custom topics
+joint_scoring = True  # toggle whether we use full depth scores or single CSV
+offline_build = False  # True: processes only map catalogs published by scripts/build_catalog.py, they never parse inputs
+catalog_keep = 2  # newest catalog versions never garbage-collected
+catalog_grace_seconds = 600.0  # how long a replaced catalog version stays for processes still switching over
+re_issue = re.compile(r"[^0-9A-Za-z]+")
+re_score_item = re.compile(r"(\n)|'([^'\n]*)'\s*:\s*'?(-?\d+)'?(?=\s*[,}])")  # row break or one 'name': 'value' entry
+issue_titles = 10   # how many titles to show on single issue
+tie_breaks = [('avg_score', False), ('original_release_year', False)]  # order among equally scored titles
+filter_columns = ['original_release_year', 'avg_score', 'age_number', 'positive_messages_score',
+                  'positive_role_models_score', 'educational_value_score', 'violence_score',
+                  'violence_scariness_score', 'sex_score', 'sexy_stuff_score', 'language_score',
+                  'consumerism_score', 'drinking_drugs_smoking_score']  # columns read by the sidebar
+
+def simple_score(str_source):
+    return f"score_{re_issue.sub(r'_', str_source)}"
+
+def listing_columns(catalog):
+    """Columns needed to filter and rank titles; display-only columns stay on disk (and the issue
+    scores in the catalog's score matrix)."""
+    return filter_columns + [c for c in catalog.columns if c == 'social_issue']
+
+
+def data_checksum(sources):
+    """Checksum over the fingerprints of all inputs (see data_sources)."""
+    m = hashlib.md5()
+    for part in sorted(sources):
+        m.update(f"{part}:{sources[part]['fingerprint']}".encode())
+    return m.hexdigest()[:8]
+
+
+def data_version():
+    """Cheap version string of everything load_bundle reads, changes whenever an input file does
+    (with `offline_build`, whenever a newer catalog is published instead of when its inputs change)."""
+    inputs = [path.join(data_dir, 'trend30.csv')] + \
+             [p for p in [path.join(embedding_dir, embedding_manifest)] if path.exists(p)]
+    if offline_build:
+        versions = catalog_versions(data_dir, "data_bundle")
+        return f"{path.basename(versions[0][0]) if versions else 'unbuilt'}-{file_fingerprint(inputs)}"
+    return f"{data_checksum(data_sources())}-{file_fingerprint(inputs)}"
+
+
+def load_bundle():
+    """Load the data every page needs; done once per process and data version, shared by all sessions."""
+    catalog = latest_catalog(data_dir, "data_bundle") if offline_build else None
+    if catalog is None:  # built here when catalogs aren't built offline (or none was published yet)
+        catalog = data_load("data_bundle", True)
+    catalog.map_columns()  # keeps working when a later build garbage-collects this version
+    data = {'catalog': catalog,
+            'listing': catalog.frame(listing_columns(catalog)),  # only the ranking columns are mapped in
+            'scores': catalog.scores,  # score column -> scores of every title, one matrix block per issue
+            'index': catalog_index(catalog, filter_columns),
+            'trends': load_trends(path.join(data_dir, 'trend30.csv'), path.join(data_dir, 'trends')),
+            'topics': load_topics(catalog)}
+    data['bounds'] = filter_bounds(data['listing'])  # slider extents
+    # most sessions never move a slider, so their page is ranked and rendered here once
+    data['landing_titles'] = titles = landing_titles(data)
+    data['landing'] = None if titles is None else render_landing(catalog, titles)
+    return data
+
+
+def load_topics(catalog):
+    """Free-text topic search over the catalog summaries, or None when no embedding is installed.
+    The summary vectors are computed once per summary text and embedding, then memory-mapped."""
+    if not joint_scoring or not path.exists(path.join(embedding_dir, embedding_manifest)):
+        return None
+    embeddings = Embeddings(embedding_dir)
+    texts = catalog.values('summary')
+    title_vectors = embed_titles(embeddings, texts, path.join(embedding_dir, f"titles.{titles_key(texts)}.npy"))
+    return TopicSearch(embeddings, title_vectors)
+
+
+def use_data_dir(path_root):
+    """Read the inputs (and keep the catalog versions) under another data directory"""
+    global data_dir, score_dir, embedding_dir
+    data_dir = path_root
+    score_dir = path.join(path_root, "score_data")
+    embedding_dir = path.join(path_root, "embedding")
+
+
+def issue_order(issue):
+    """Sort order of the single issue page: closest titles first, then the tie-breaks."""
+    return [(simple_score(issue), True)] + list(tie_breaks)
+
+
+def with_scores(scores, issue, values):
+    """Issue scores plus the scores of one more issue (e.g. a typed topic); the shared scores stay untouched."""
+    return ChainMap({simple_score(issue): values}, scores)
+
+
+def best_titles(frame, issues, scores):
+    """Best title of every issue in one pass over the issue scores (lowest score, ties go to the
+    higher average score and newer release).
+
+    :param frame: DataFrame of (filtered) titles, indexed by catalog row position
+    :param issues: Issue names; issues without scores are left out
+    :param scores: Mapping of score column -> scores of every catalog row (see `load_bundle`)
+    :returns: dict -- score column -> catalog row position of its best title
+    """
+    issue_columns = [simple_score(issue) for issue in issues if simple_score(issue) in scores]
+    if not len(frame) or not issue_columns:
+        return {}
+    return dict(zip(issue_columns, best_rows(frame, issue_columns, tie_breaks, scores)))
+
+
+def filter_bounds(frame):
+    """(min, max) of every filter column, the extent of its sidebar slider"""
+    return {name: (frame[name].min(), frame[name].max()) for name in filter_columns}
+
+
+def default_ranges(bounds):
+    """Filter ranges of an untouched sidebar: every slider spans its column, columns with a single
+    value get no slider and the page's (0, 5) placeholder range."""
+    return {name: (low, high) if low != high else (0, 5) for name, (low, high) in bounds.items()}
+
+
+def landing_titles(data):
+    """Best title of every trending issue for an untouched sidebar, in trending order
+    :param data: Data bundle (see `load_bundle`) with its filter 'bounds'
+    :returns: list -- (issue, catalog row position) per issue with a title, None without `joint_scoring`
+    """
+    if not joint_scoring:
+        return None
+    matched = select_titles(data['listing'], default_ranges(data['bounds']), None, data['index'], filter_columns,
+                            data['catalog'].path_dir)
+    top_rows = best_titles(matched, data['trends'].ranking, data['scores'])
+    return [(issue, top_rows[simple_score(issue)]) for issue in data['trends'].ranking
+            if simple_score(issue) in top_rows]
+
+
+def file_fingerprint(filepaths):
+    """Short checksum of input files from their path, modify time and size."""
+    m = hashlib.md5()
+    for filepath in filepaths:
+        stat = Path(filepath).stat()
+        m.update(f"{filepath}:{stat.st_mtime}:{stat.st_size}".encode())
+    return m.hexdigest()[:8]
+
+
+def data_sources():
+    """Map each part of the catalog to the input files it is built from: 'base' for the title
+    data plus one entry per issue score column, each with its own fingerprint."""
+    sources = {'base': [path.join(data_dir, 'app_data.tsv')]}
+    if joint_scoring:  # one score column per CSV file
+        for filename in Path(score_dir).rglob(f'*.csv'):
+            sources.setdefault(simple_score(Path(filename).stem), []).append(str(filename))  # last file wins
+    else:  # prior method to load issue matching file
+        sources['base'].append(path.join(data_dir, 'issue_matching.csv'))
+    return {part: {'files': files, 'fingerprint': file_fingerprint(files)} for part, files in sources.items()}
+
+
+def data_load(stem_datafile, allow_cache=True):
+    """Because of repetitive loads in streamlit, a method to read/save cache data according to modify time.
+    The bundle is a columnar catalog directory that is memory-mapped, so workers share one page-cached copy.
+    Each input is fingerprinted on its own, so a changed score CSV only rebuilds its own column."""
+
+    # generate a checksum of the input files
+    sources = data_sources()
+
+    # NOTE: a pickle had to be unpickled whole into every worker; the catalog directory keeps
+    # fixed-width columns (.npy) and dictionary-encoded strings that are mapped lazily instead
+    path_new = path.join(data_dir, f"{stem_datafile}.{data_checksum(sources)}")
+
+    # see if checksum matches the datafile (plus stem)
+    if allow_cache:
+        catalog = open_catalog(path_new)
+        if catalog is not None:   # if so, map old catalog, skip reload
+            # a build that crashed before it could publish leaves its staging directory behind
+            collect_catalogs(data_dir, stem_datafile, catalog_keep, catalog_grace_seconds)
+            return catalog
+
+        # if only score files changed, rebuild just those columns on top of the last catalog
+        catalog = latest_catalog(data_dir, stem_datafile)
+        if catalog is not None and catalog.sources.get('base') == sources['base']:
+            stale = [part for part in sources if part != 'base' and catalog.sources.get(part) != sources[part]]
+            dropped = [part for part in catalog.sources if part not in sources]
+            print(f"Score data has changed, updating {stale} (dropping {dropped}) in data bundle {path_new}...")
+            imdb_ids = pd.Index(catalog.values('imdb_id'))
+            scores = {part: load_issue_score(sources[part]['files'], imdb_ids) for part in stale}
+            catalog = open_catalog(extend_catalog(catalog, path_new, {}, dropped, sources, scores))
+            collect_catalogs(data_dir, stem_datafile, catalog_keep, catalog_grace_seconds)
+            return catalog
+
+    print(f"Data has changed, regenerating core data bundle file {path_new}...")
+
+    trending_df = build_titles()
+    scores = {}
+    if joint_scoring:  # one block of the score matrix per CSV file
+        imdb_ids = pd.Index(trending_df.index)  # imdb_id -> row, hashed once for all the files
+        scores = {part: load_issue_score(sources[part]['files'], imdb_ids) for part in sources if part != 'base'}
+
+    # save new data file before returning
+    catalog = open_catalog(write_catalog(trending_df, path_new, sources, scores))
+    total = layout_report(catalog).loc['total']
+    print(f"Compact layout: {total['bytes_before'] / 1e6:.1f} MB as built, {total['bytes_after'] / 1e6:.1f} MB stored "
+          f"(see python catalog.py {path_new})")
+
+    # drop older versions (and stale bundle files of earlier formats)
+    collect_catalogs(data_dir, stem_datafile, catalog_keep, catalog_grace_seconds)
+    return catalog
+
+
+def build_catalog(stem_datafile="data_bundle", allow_cache=True):
+    """Build (or reuse) the catalog for the current inputs outside of any app process and make it
+    the newest published version, which running processes switch to (see `offline_build`).
+
+    :param stem_datafile: Bundle stem
+    :param allow_cache: Reuse an existing or incrementally updated catalog where possible
+    :returns: Catalog -- the published catalog
+    """
+    catalog = data_load(stem_datafile, allow_cache)
+    # newest even if the inputs went back to those of an older version that was still on disk
+    Path(catalog.path_dir, catalog_manifest).touch()
+    return catalog
+
+
+def load_issue_score(filenames, imdb_ids):
+    """Read one issue score CSV and align it to the catalog titles (np.inf where a title has no score,
+    including an empty one: such titles rank last for the issue instead of leaving the catalog).
+
+    :param filenames: CSVs with columns 'imdb_id' and 'inf_dist_summary' (only the last one is used)
+    :param imdb_ids: pd.Index of the integer imdb ids of the catalog rows, in row order
+    :returns: np.ndarray -- float scores, one per catalog row
+    """
+    for filename_skip in filenames[:-1]:
+        print(f"Warning {filename_skip}, replaced by {filenames[-1]}")
+    filename = filenames[-1]
+    print(f"Reading {filename}")
+    match_df = pd.read_csv(filename, dtype=str)
+    match_df['imdb_id'] = match_df['imdb_id'].str.replace('tt', '').astype(int)  # coerce to int
+    match_df.drop_duplicates('imdb_id', inplace=True)
+    match_s = match_df.set_index('imdb_id')['inf_dist_summary'].astype(float).fillna(np.inf)
+    if not imdb_ids.is_unique:  # titles listed twice both get the score
+        return match_s.reindex(imdb_ids, fill_value=np.inf).values
+
+    # one vectorized join: look the file's ids up in the catalog's imdb_id -> row index
+    rows = imdb_ids.get_indexer(match_s.index)
+    scores = np.full(len(imdb_ids), np.inf)
+    scores[rows[rows >= 0]] = match_s.values[rows >= 0]
+    return scores
+
+
+def parse_scores(scores):
+    """Expand the per-title score dicts (stored as python literals) into one column per score name.
+
+    The whole column is scanned with a single regex pass instead of a ``literal_eval`` per row;
+    rows that don't follow the simple ``{'name': 'value', ...}`` layout fall back to ``literal_eval``
+    and rows that can't be parsed at all are treated as empty.
+
+    :param scores: Series of dict literals (e.g. "{'Violence': '2', 'Sex': '0'}")
+    :returns: pd.DataFrame -- float column per score name (NaN when missing), same index as scores
+    """
+    text = scores.fillna('{}').astype(str).values.astype(str)
+    multiline = np.char.find(text, '\n') >= 0  # would be taken for row breaks, scanned as '{}' and parsed below
+    found = np.array(re_score_item.findall('\n'.join(np.where(multiline, '{}', text))), dtype=str).reshape(-1, 3)
+    is_break = found[:, 0] == '\n'
+    rows = np.cumsum(is_break)[~is_break]
+    keys, values = found[~is_break, 1], found[~is_break, 2].astype(float)
+
+    # columns in order of first appearance, like building a frame from the dicts
+    names, first, key_idx = np.unique(keys, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    names, key_idx = list(names[order]), np.argsort(order)[key_idx]
+    split = np.full((len(text), len(names)), np.nan)
+    split[rows, key_idx] = values
+
+    # anything the regex didn't fully account for goes through the slow parser
+    entries = np.bincount(rows, minlength=len(text))
+    colons = np.char.count(text, ':')
+    simple = np.char.startswith(text, '{') & np.char.endswith(text, '}')
+    for i in np.flatnonzero((entries != colons) | ~simple | multiline):
+        try:
+            parsed = dict(ast.literal_eval(text[i]))
+        except (ValueError, TypeError, SyntaxError):
+            print(f"Warning, unparseable scores '{text[i][:80]}', skipping")
+            parsed = {}
+        split[i, :] = np.nan
+        for name, value in parsed.items():
+            if name not in names:
+                names.append(name)
+                split = np.hstack([split, np.full((len(text), 1), np.nan)])
+            split[i, names.index(name)] = pd.to_numeric(value, errors='coerce')
+    return pd.DataFrame(split, index=scores.index, columns=names)
+
+
+def build_titles():
+    """Parse and normalize the title data (everything but the per-issue score columns)."""
+    # Pull in the data about the movies
+    trending_df = pd.read_csv(path.join(data_dir, 'app_data.tsv'), sep='\t')
+
+    # Pull in the matching movie to social issue data and merge
+    trending_df['imdb_id'] = trending_df['imdb_id'].str.replace('tt','').astype(int)  # convert to int
+    if joint_scoring:  # issue scores are joined per column by the caller
+        trending_df.set_index('imdb_id', drop=True, inplace=True)
+    else:  # prior method to load issue matching file
+        match_df = pd.read_csv(path.join(data_dir, 'issue_matching.csv'))
+        # match_df.set_index('imdb_id', drop=True, inplace=True)
+        trending_df = trending_df.merge(match_df[['imdb_id', 'social_issue','match_score']])
+        
+    # debug print a few rows for diversity
+    # with pd.option_context('display.max_rows', None, 'display.max_columns', None):  # more options can be specified also
+    #    print(trending_df.sample(3))
+    
+    # Process data to proper format
+    trending_df = trending_df.rename(columns={'release_year': 'original_release_year',
+                                              'hbogo_url': 'hbo_url',
+                                              'short_desc': 'summary'})
+    trending_df['scores'] = trending_df['scores'].fillna('{}')
+
+    # now, extract age from the data for another slider (from age 8+); added 0.9.3
+    trending_df["age_number"] = trending_df.age_child.fillna('0').str.replace('None', '0')
+    trending_df["age_number"] = trending_df.age_number.str.replace(r'age (\d+)\+', r'\1').astype(int)
+    
+
+    # Adjust scores to be a column per score
+    trending_df_split = parse_scores(trending_df['scores'])
+    trending_df = trending_df.join(trending_df_split)
+    trending_df = trending_df.rename(columns={'Consumerism': 'consumerism_score',
+                                              'Drinking, Drugs & Smoking': 'drinking_drugs_smoking_score',
+                                              'Language': 'language_score',
+                                              'Positive Messages': 'positive_messages_score',
+                                              'Positive Role Models & Representations': 'positive_role_models_score',
+                                              'Sex': 'sex_score',
+                                              'Violence': 'violence_score',
+                                              'Educational Value': 'educational_value_score',
+                                              'Sexy Stuff': 'sexy_stuff_score',
+                                              'Violence & Scariness': 'violence_scariness_score'})
+
+    # Fill missing data with defaults
+    trending_df['hbo_url'] = trending_df['hbo_url'].fillna('https://play.hbonow.com/')
+    trending_df['movie_trailer_url'] = trending_df['movie_trailer_url'].fillna('https://play.hbonow.com/')
+    trending_df['age_child'] = trending_df['age_child'].fillna('Not Set')
+    trending_df = trending_df[~trending_df['title'].astype(str).str.contains('{')]
+
+    # Fill missing scores with 0
+    all_scores = ['consumerism_score','positive_messages_score','positive_role_models_score','educational_value_score','violence_score','sex_score','language_score','consumerism_score','drinking_drugs_smoking_score','sexy_stuff_score','violence_scariness_score']
+    for score in all_scores:
+        trending_df[score] = trending_df[score].fillna(0).astype(int)
+        trending_df[score] = np.where(~trending_df[score].isin([1,2,3,4,5]), 0, trending_df[score])
+
+    # Invert "negative" scores so they can be assessed similarly to the "positive" scores
+    neg_scores = ['violence_score','sex_score','language_score','consumerism_score','drinking_drugs_smoking_score','sexy_stuff_score','violence_scariness_score']
+    for neg_score in neg_scores:
+        trending_df['neg_' + neg_score] = np.where(trending_df[neg_score] == 1, 5,
+                                                   np.where(trending_df[neg_score] == 2, 4,
+                                                            np.where(trending_df[neg_score] == 4, 2,
+                                                                     np.where(trending_df[neg_score] == 5, 1,
+                                                                              trending_df[neg_score]))))
+
+    # Calculate a VERY basic average score for each title
+    trending_df['non_zero_scores'] = trending_df[all_scores].astype(bool).sum(axis=1) + 1
+    trending_df = trending_df.dropna()
+    trending_df['original_release_year'] = trending_df['original_release_year'].astype(int)
+    trending_df['avg_score'] = ((trending_df[['positive_messages_score',
+                                              'positive_role_models_score',
+                                              'educational_value_score',
+                                              'neg_violence_score',
+                                              'neg_sex_score',
+                                              'neg_language_score',
+                                              'neg_consumerism_score',
+                                              'neg_drinking_drugs_smoking_score',
+                                              'neg_sexy_stuff_score',
+                                              'neg_violence_scariness_score']].sum(axis=1) /
+                                          trending_df['non_zero_scores'].astype(float) )).round(1)
+
+    # (trending_df['match_score'])).astype(float)/np.where(trending_df['non_zero_scores'] == 0, 1, trending_df['non_zero_scores'])).round(1).astype(float)
+
+    return trending_df
@@ -0,0 +1,557 @@
+# Columnar, memory-mapped storage for the merged title catalog
+import argparse
+import fcntl
+import json
+import os
+import re
+import shutil
+import time
+from collections.abc import Mapping
+from os import path
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+catalog_manifest = "catalog.json"
+catalog_format = 3  # 2: compact dtypes, 3: issue scores in one matrix; catalogs of other formats are rebuilt
+re_column = re.compile(r"[^0-9A-Za-z_]+")
+rank_prefixes = ("score_",)  # columns only ever ordered (never compared to slider values)
+score_file = "scores.bin"  # issue score matrix, one float32 block of all titles per issue
+score_dtype = np.dtype("<f4")
+
+
+def column_file(name, suffix="npy"):
+    """Safe on-disk file name for a column
+    :param name: Column name in the catalog
+    :param suffix: File extension to append
+    :returns: str -- file name (no directory)
+    """
+    return f"{re_column.sub('_', name)}.{suffix}"
+
+
+def encode_strings(series):
+    """Dictionary-encode a column of strings
+    :param series: pandas Series of strings (missing values allowed)
+    :returns: tuple -- (codes array of the smallest signed int type, utf-8 byte blob uint8 array, offsets int64 array)
+    """
+    codes, uniques = pd.factorize(series, sort=False)
+    encoded = [str(v).encode("utf-8") for v in uniques]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(v) for v in encoded])
+    blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return codes.astype(int_type(-1, len(uniques))), blob, offsets
+
+
+def int_type(low, high):
+    """Smallest signed integer dtype holding [low, high] whose values can all be negated (sort keys are)"""
+    for dtype in (np.int8, np.int16, np.int32):
+        if np.iinfo(dtype).min < low and high <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def rank_float32(values):
+    """float32 copy of a float column that orders exactly like the original: distinct values that
+    round to the same float32 are pushed apart by the fewest float32 steps, non-finite values such
+    as the np.inf sentinel stay as they are.  A value only ever moves up, by one step per smaller
+    distinct value in the run of occupied neighbouring float32s it is pushed along, so the shift is
+    bounded by how many values collide there (1000 values within 1e-6 of each other near 1.0 move
+    by up to ~1000 steps, about 1e-4) -- the order is exact, the values themselves are not
+    :param values: float array
+    :returns: np.ndarray -- float32 values, or None if they can't be kept apart inside the float32 range
+    """
+    narrow = values.astype(np.float32)
+    finite = np.isfinite(values)
+    uniq, inverse = np.unique(values[finite], return_inverse=True)
+    # integers that sort like the float32 values, consecutive integers are neighbouring floats
+    bits = uniq.astype(np.float32).view(np.int32).astype(np.int64)
+    keys = np.where(bits < 0, -(bits & 0x7fffffff) - 1, bits)
+    steps = np.arange(len(keys))
+    keys = np.maximum.accumulate(keys - steps) + steps  # strictly increasing, each as low as possible
+    if len(keys) and keys[-1] > np.float32(np.finfo(np.float32).max).view(np.int32):
+        return None
+    bits = np.where(keys < 0, (-(keys + 1)) | -0x80000000, keys).astype(np.int32)
+    narrow[finite] = bits.view(np.float32)[inverse.reshape(-1)]
+    return narrow
+
+
+def compact_numbers(name, values):
+    """Narrowest dtype that keeps a numeric column's results unchanged: integers get the smallest
+    signed integer type holding their range; floats become float32 when that is exact, and ranking
+    columns (see `rank_prefixes`) become float32 in an order-preserving way (see `rank_float32`),
+    with np.inf staying the missing-value sentinel.
+
+    :param name: Column name
+    :param values: numpy array of a numeric column
+    :returns: np.ndarray -- the values, converted if a narrower dtype is safe
+    """
+    if values.dtype.kind in "iu" and len(values):
+        dtype = int_type(values.min(), values.max())
+        return values.astype(dtype) if dtype.itemsize < values.dtype.itemsize else values
+    if values.dtype.kind == "f" and values.dtype.itemsize > 4:
+        narrow = values.astype(np.float32)
+        if np.array_equal(narrow, values, equal_nan=True):
+            return narrow
+        if name.startswith(rank_prefixes):
+            narrow = rank_float32(values)
+            if narrow is not None:
+                return narrow
+    return values
+
+
+def write_column(path_dir, name, values, manifest):
+    """Write one column into a catalog directory and record it in the manifest
+    :param path_dir: Catalog directory being written
+    :param name: Column name
+    :param values: pandas Series or numpy array of values
+    :param manifest: Manifest dict to update in place
+    """
+    col = pd.Series(values) if not isinstance(values, pd.Series) else values
+    layout = {"source_dtype": col.dtype.str, "source_bytes": int(col.memory_usage(index=False, deep=True))}
+    if pd.api.types.is_numeric_dtype(col.dtype) or pd.api.types.is_bool_dtype(col.dtype):
+        values = compact_numbers(name, np.ascontiguousarray(col.values))
+        np.save(path.join(path_dir, column_file(name)), values)
+        manifest["columns"][name] = {"kind": "numeric", "dtype": values.dtype.str, "file": column_file(name),
+                                     "bytes": values.nbytes, **layout}
+    else:
+        codes, blob, offsets = encode_strings(col)
+        np.save(path.join(path_dir, column_file(name, "codes.npy")), codes)
+        np.save(path.join(path_dir, column_file(name, "values.npy")), blob)
+        np.save(path.join(path_dir, column_file(name, "offsets.npy")), offsets)
+        manifest["columns"][name] = {"kind": "string", "codes": column_file(name, "codes.npy"),
+                                     "values": column_file(name, "values.npy"),
+                                     "offsets": column_file(name, "offsets.npy"), "dtype": codes.dtype.str,
+                                     "bytes": codes.nbytes + blob.nbytes + offsets.nbytes, **layout}
+
+
+def column_files(info):
+    """All file names backing one manifest column entry"""
+    return [info[k] for k in ("file", "codes", "values", "offsets") if k in info]
+
+
+def publish_catalog(path_tmp, path_dir, manifest):
+    """Write the manifest and rename a finished temporary directory into place, so readers
+    never observe a half-written catalog.  A published catalog is never replaced: when another
+    process already published the same version (same inputs), this build is dropped and theirs
+    is used; a catalog of an earlier format under the same name is swapped out and removed.
+
+    :returns: str -- path of the published directory
+    """
+    with open(path.join(path_tmp, catalog_manifest), "wt") as f:
+        json.dump(manifest, f, indent=1)
+    while True:
+        try:
+            os.rename(path_tmp, path_dir)  # atomic, and fails if the directory exists and isn't empty
+            return path_dir
+        except OSError:
+            if not path.isdir(path_dir):
+                raise
+        if open_catalog(path_dir) is not None:  # published by a concurrent build of the same inputs
+            shutil.rmtree(path_tmp, ignore_errors=True)
+            return path_dir
+        path_old = f"{path_dir}.old-{time.time_ns()}.tmp-{os.getpid()}"
+        try:
+            os.rename(path_dir, path_old)
+        except FileNotFoundError:  # swapped out by a concurrent build
+            continue
+        # a version a concurrent build published in between is left for collect_catalogs instead
+        if open_catalog(path_old) is None:
+            shutil.rmtree(path_old, ignore_errors=True)
+
+
+def staging_dir(path_dir):
+    """Fresh temporary directory next to the final catalog location"""
+    path_tmp = f"{path_dir}.tmp-{os.getpid()}"
+    if path.exists(path_tmp):
+        shutil.rmtree(path_tmp)
+    os.makedirs(path_tmp)
+    return path_tmp
+
+
+def score_row(values):
+    """One issue's scores as float32 in the same order as the float64 input (see `rank_float32`)"""
+    values = np.asarray(values, dtype=np.float64)
+    narrow = rank_float32(values)
+    return values.astype(score_dtype) if narrow is None else narrow
+
+
+def write_scores(path_dir, manifest, scores, base=None, drop=()):
+    """Write issue scores into the score matrix of a catalog being built and record their slots.
+
+    The matrix is stored issue by issue (every issue is one contiguous block of all titles), so an
+    issue is added by appending to the file: a new version hard-links the file of ``base`` and
+    appends the new and replaced issues after the blocks already there, which older versions
+    never look past.  Builds from the same base share that file, so the blocks are reserved under
+    an exclusive lock of it and then written at their reserved offsets.  Blocks of replaced issues
+    are left behind until they outnumber the live ones, then a compact file is written instead.
+
+    :param path_dir: Catalog directory being written
+    :param manifest: Manifest dict to update in place (its 'rows' must be set)
+    :param scores: dict of score column -> values (one per catalog row) to write
+    :param base: Optional :class:`Catalog` whose issue scores are carried over
+    :param drop: Score columns of ``base`` to leave out
+    """
+    rows, path_file = manifest["rows"], path.join(path_dir, score_file)
+    block = rows * score_dtype.itemsize
+    for name, values in scores.items():
+        if len(values) != rows:
+            raise ValueError(f"Score column {name} has {len(values)} rows, catalog has {rows}")
+    slots = {name: slot for name, slot in (base.scores.slots.items() if base is not None else ())
+             if name not in drop}
+    kept = [name for name in slots if name not in scores]
+    linked = False
+    if base is not None and kept and block:
+        path_base = path.join(base.path_dir, score_file)
+        if -(-path.getsize(path_base) // block) + len(scores) <= 2 * len(slots.keys() | scores.keys()):
+            try:
+                os.link(path_base, path_file)
+                linked = True
+            except OSError:
+                pass
+    with open(path_file, "r+b" if linked else "wb") as f:
+        if linked:  # reserve blocks on a boundary past anything other builds reserved (or a failed one left)
+            fcntl.flock(f, fcntl.LOCK_EX)
+            slot = -(-os.fstat(f.fileno()).st_size // block)
+            f.truncate((slot + len(scores)) * block)
+            fcntl.flock(f, fcntl.LOCK_UN)
+        else:  # fresh compact file: kept issues first
+            for slot, name in enumerate(kept):
+                f.write(np.ascontiguousarray(base.scores[name]).tobytes())
+                slots[name] = slot
+            slot = len(kept)
+        for name, values in scores.items():
+            f.seek(slot * block)
+            f.write(score_row(values).tobytes())
+            slots[name], slot = slot, slot + 1
+    manifest["scores"] = {"file": score_file, "dtype": score_dtype.str, "issues": slots}
+
+
+def write_catalog(df, path_dir, sources=None, scores=None):
+    """Write a catalog DataFrame as one file per column; numeric columns are stored
+    fixed-width so they can be memory-mapped, strings are dictionary-encoded.
+    Issue scores go into one titles-by-issues matrix (see `write_scores`).
+
+    :param df: DataFrame to store (index is kept as the column 'imdb_id')
+    :param path_dir: Destination directory for the catalog
+    :param sources: Optional dict of input fingerprints each part of the catalog was built from
+    :param scores: Optional dict of score column -> values, one per row of ``df``
+    :returns: str -- path of the published directory
+    """
+    path_tmp = staging_dir(path_dir)
+    try:
+        df = df.reset_index()
+        if "index" in df.columns:  # unnamed index; nothing worth keeping
+            del df["index"]
+        manifest = {"format": catalog_format, "rows": len(df), "columns": {}, "sources": sources or {}}
+        for name in df.columns:
+            write_column(path_tmp, name, df[name], manifest)
+        write_scores(path_tmp, manifest, scores or {})
+        return publish_catalog(path_tmp, path_dir, manifest)
+    except BaseException:  # a process that keeps running would keep its staging directory from collect_catalogs
+        shutil.rmtree(path_tmp, ignore_errors=True)
+        raise
+
+
+def extend_catalog(catalog, path_dir, columns, drop=(), sources=None, scores=None):
+    """Derive a new catalog version from an existing one by replacing or appending columns.
+    Untouched columns are hard-linked (copied if linking fails), so only the changed
+    columns cost any I/O and both versions share page-cached data; new or replaced issue
+    scores are appended to the shared score matrix.
+
+    :param catalog: Existing :class:`Catalog` to start from
+    :param path_dir: Destination directory for the new version
+    :param columns: dict of column name -> values (one per catalog row) to write
+    :param drop: Column or score column names to leave out of the new version
+    :param sources: Optional replacement for the input fingerprints in the manifest
+    :param scores: Optional dict of score column -> values (one per catalog row) to write
+    :returns: str -- path of the published directory
+    """
+    path_tmp = staging_dir(path_dir)
+    try:
+        manifest = {"format": catalog_format, "rows": len(catalog), "columns": {},
+                    "sources": catalog.manifest.get("sources", {}) if sources is None else sources}
+        for name, info in catalog.manifest["columns"].items():
+            if name in drop or name in columns:
+                continue
+            for filename in column_files(info):
+                try:
+                    os.link(path.join(catalog.path_dir, filename), path.join(path_tmp, filename))
+                except OSError:
+                    shutil.copy2(path.join(catalog.path_dir, filename), path.join(path_tmp, filename))
+            manifest["columns"][name] = info
+        for name, values in columns.items():
+            if len(values) != len(catalog):
+                raise ValueError(f"Column {name} has {len(values)} rows, catalog has {len(catalog)}")
+            write_column(path_tmp, name, values, manifest)
+        write_scores(path_tmp, manifest, scores or {}, catalog, drop)
+        return publish_catalog(path_tmp, path_dir, manifest)
+    except BaseException:  # see write_catalog
+        shutil.rmtree(path_tmp, ignore_errors=True)
+        raise
+
+
+class StringColumn:
+    """Dictionary-encoded strings; codes are memory-mapped and only the dictionary
+    entries that are actually requested get decoded."""
+
+    def __init__(self, codes, blob, offsets):
+        self.codes = codes
+        self.blob = blob
+        self.offsets = offsets
+        self.dtype = np.dtype(object)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def decode(self, codes):
+        """Decode dictionary codes into an object array of strings (None when missing)"""
+        uniq, inverse = np.unique(np.asarray(codes), return_inverse=True)
+        decoded = np.empty(len(uniq), dtype=object)
+        for idx, code in enumerate(uniq):
+            if code < 0:
+                decoded[idx] = None
+            else:
+                decoded[idx] = bytes(self.blob[self.offsets[code]:self.offsets[code + 1]]).decode("utf-8")
+        return decoded[inverse.reshape(-1)]
+
+    def take(self, rows):
+        return self.decode(self.codes[rows])
+
+    def to_numpy(self):
+        return self.decode(self.codes)
+
+
+class ScoreMatrix(Mapping):
+    """Issue scores of a catalog as a mapping of score column -> memory-mapped float32 scores of
+    every title.  All issues live in one titles-by-issues matrix file, stored issue by issue
+    (``data`` is issues x titles), so the scores of one issue are a single contiguous block."""
+
+    def __init__(self, path_file, info, rows):
+        """
+        :param path_file: Score matrix file of the catalog
+        :param info: The manifest's 'scores' entry (dtype and slot of every issue)
+        :param rows: Number of titles in the catalog
+        """
+        self.slots = info["issues"]
+        dtype, count = np.dtype(info["dtype"]), max(self.slots.values(), default=-1) + 1
+        if count and rows:  # the file may be longer, later versions append to it
+            self.data = np.memmap(path_file, dtype=dtype, mode="r", shape=(count, rows))
+        else:
+            self.data = np.zeros((count, rows), dtype=dtype)
+
+    def __getitem__(self, name):
+        return self.data[self.slots[name]]
+
+    def __iter__(self):
+        return iter(self.slots)
+
+    def __len__(self):
+        return len(self.slots)
+
+
+class Catalog:
+    """Read-only view of a catalog written by :func:`write_catalog`; columns are
+    opened lazily on first access and shared through the OS page cache."""
+
+    def __init__(self, path_dir):
+        self.path_dir = path_dir
+        with open(path.join(path_dir, catalog_manifest)) as f:
+            self.manifest = json.load(f)
+        self._opened = {}
+        self._scores = None
+
+    @property
+    def sources(self):
+        return self.manifest.get("sources", {})
+
+    @property
+    def columns(self):
+        return list(self.manifest["columns"])
+
+    @property
+    def scores(self):
+        """Issue scores as a :class:`ScoreMatrix` (score column -> scores of every title)"""
+        if self._scores is None:
+            info = self.manifest.get("scores", {"dtype": score_dtype.str, "issues": {}})
+            self._scores = ScoreMatrix(path.join(self.path_dir, score_file), info, len(self))
+        return self._scores
+
+    def __len__(self):
+        return self.manifest["rows"]
+
+    def __contains__(self, name):
+        return name in self.manifest["columns"] or name in self.scores
+
+    def map_columns(self):
+        """Map every column now instead of on first access, so a process serving this version can
+        still read all of it after the directory was removed (see :func:`collect_catalogs`)
+        :returns: Catalog -- self
+        """
+        for name in self.columns:
+            self[name]
+        self.scores
+        return self
+
+    def _load(self, filename):
+        return np.load(path.join(self.path_dir, filename), mmap_mode="r")
+
+    def __getitem__(self, name):
+        """Memory-mapped numeric array or :class:`StringColumn` for a column (or an issue's scores)"""
+        if name not in self.manifest["columns"] and name in self.scores:
+            return self.scores[name]
+        if name not in self._opened:
+            info = self.manifest["columns"][name]
+            if info["kind"] == "numeric":
+                self._opened[name] = self._load(info["file"])
+            else:
+                self._opened[name] = StringColumn(self._load(info["codes"]), self._load(info["values"]),
+                                                  self._load(info["offsets"]))
+        return self._opened[name]
+
+    def values(self, name, rows=None):
+        """Materialized values of one column, optionally restricted to row positions"""
+        col = self[name]
+        if isinstance(col, StringColumn):
+            return col.to_numpy() if rows is None else col.take(rows)
+        return col if rows is None else col[rows]
+
+    def frame(self, columns=None, rows=None):
+        """Build a DataFrame over a subset of columns and rows; the index holds catalog
+        row positions so results can be mapped back with ``frame(rows=df.index)``.
+
+        Without ``rows``, numeric columns are wrapped without copying the mapped data.
+
+        :param columns: Column names to include (default: all but 'imdb_id')
+        :param rows: Optional array of row positions to gather
+        :returns: pd.DataFrame
+        """
+        if columns is None:
+            columns = [c for c in self.columns if c != "imdb_id"]
+        if rows is None:
+            index = pd.RangeIndex(len(self))
+        else:
+            rows = np.asarray(rows, dtype=np.int64)
+            index = pd.Index(rows)
+        return pd.DataFrame({c: self.values(c, rows) for c in columns}, index=index, copy=False)
+
+
+def open_catalog(path_dir):
+    """Open a catalog directory for reading
+    :param path_dir: Directory written by :func:`write_catalog`
+    :returns: Catalog -- lazily mapped catalog, or None if no catalog (of the current format) is present
+    """
+    try:
+        catalog = Catalog(path_dir)
+    except FileNotFoundError:  # not built (or swapped out while opening)
+        return None
+    return catalog if catalog.manifest.get("format") == catalog_format else None
+
+
+def layout_report(catalog):
+    """Bytes per column as loaded before the compact layout (pandas dtypes of the built frame)
+    and as stored now
+    :param catalog: Catalog to report on
+    :returns: pd.DataFrame -- one row per column plus a 'total' row: dtype before and after, bytes
+        before and after and the ratio
+    """
+    report = [{"column": name, "dtype_before": info.get("source_dtype"), "dtype_after": info.get("dtype"),
+               "bytes_before": info.get("source_bytes", 0), "bytes_after": info.get("bytes", 0)}
+              for name, info in catalog.manifest["columns"].items()]
+    # issue scores were float64 frame columns before, now float32 blocks of the score matrix
+    report += [{"column": name, "dtype_before": "<f8", "dtype_after": catalog.scores.data.dtype.str,
+                "bytes_before": 8 * len(catalog), "bytes_after": catalog.scores.data.dtype.itemsize * len(catalog)}
+               for name in catalog.scores]
+    report = pd.DataFrame(report, columns=["column", "dtype_before", "dtype_after", "bytes_before",
+                                           "bytes_after"]).set_index("column")
+    report.loc["total"] = [None, None, report["bytes_before"].sum(), report["bytes_after"].sum()]
+    report["ratio"] = (report["bytes_before"] / report["bytes_after"].clip(lower=1)).round(1)
+    return report
+
+
+def catalog_versions(root_dir, stem):
+    """Published catalog versions of a bundle stem, newest first (by the time the manifest was written)
+    :param root_dir: Directory holding catalog versions named '<stem>.<fingerprint>'
+    :param stem: Bundle stem
+    :returns: list -- (directory, publish time) pairs
+    """
+    versions = []
+    for p in Path(root_dir).glob(f"{stem}.*/{catalog_manifest}"):
+        if ".tmp-" in p.parent.name:
+            continue
+        try:
+            versions.append((str(p.parent), p.stat().st_mtime))
+        except FileNotFoundError:  # removed while listing
+            pass
+    return sorted(versions, key=lambda v: v[1], reverse=True)
+
+
+def latest_catalog(root_dir, stem):
+    """Most recently published catalog for a bundle stem
+    :param root_dir: Directory holding catalog versions named '<stem>.<fingerprint>'
+    :param stem: Bundle stem
+    :returns: Catalog -- newest version found, or None
+    """
+    versions = catalog_versions(root_dir, stem)
+    return open_catalog(versions[0][0]) if versions else None
+
+
+def process_running(pid):
+    """Whether a process id belongs to a running process on this machine"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # running, but somebody else's
+        return True
+    return True
+
+
+def collect_catalogs(root_dir, stem, keep=2, grace_seconds=600.0):
+    """Remove what older builds of a bundle stem left on disk: catalog versions other than the
+    ``keep`` newest of the current format, once the version that replaced them has been published
+    for ``grace_seconds`` (processes map every column when they load a version, see
+    :meth:`Catalog.map_columns`, so one still serving it is not affected either), staging
+    directories of builds that are no longer running and bundle files of earlier formats
+    (pickles, feather files).
+
+    :param root_dir: Directory holding catalog versions named '<stem>.<fingerprint>'
+    :param stem: Bundle stem
+    :param keep: Newest catalog versions that are never removed
+    :param grace_seconds: Seconds a version stays after a newer one was published
+    :returns: list -- paths that were removed
+    """
+    now, removed = time.time(), []
+    versions = catalog_versions(root_dir, stem)
+    kept = [path_dir for path_dir, _ in versions if open_catalog(path_dir) is not None][:keep]
+    for idx, (path_dir, _) in enumerate(versions):
+        if path_dir in kept or not idx or now - versions[idx - 1][1] < grace_seconds:
+            continue
+        shutil.rmtree(path_dir, ignore_errors=True)
+        removed.append(path_dir)
+    for p in Path(root_dir).glob(f"{stem}.*.tmp-*"):
+        pid = p.name.rsplit("-", 1)[-1]
+        if p.is_dir() and pid.isdigit() and not process_running(int(pid)):
+            shutil.rmtree(p, ignore_errors=True)
+            removed.append(str(p))
+    for pattern in (f"{stem}.*.pkl", f"{stem}*.feather"):
+        for p in Path(root_dir).glob(pattern):
+            if now - p.stat().st_mtime >= grace_seconds:
+                p.unlink()
+                removed.append(str(p))
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the bytes per column of a catalog before and after the compact layout")
+    parser.add_argument('path_dir', help="catalog directory (e.g. ../data/data_bundle.<fingerprint>)")
+    args = parser.parse_args()
+    catalog = open_catalog(args.path_dir)
+    if catalog is None:
+        parser.error(f"no catalog of format {catalog_format} in {args.path_dir}")
+    with pd.option_context('display.max_rows', None, 'display.max_columns', None, 'display.width', 200):
+        print(layout_report(catalog))
+
+
+if __name__ == '__main__':
+    main()
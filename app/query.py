@@ -0,0 +1,393 @@
+# Filtering and ranking of catalog titles, independent of the Streamlit page
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from tracing import current_trace
+
+result_cache_entries = 512        # most cached query results
+result_cache_bytes = 64 << 20     # most bytes of row ids held by cached query results
+presorted_bytes = 256 << 20       # most bytes of presorted catalog permutations kept (one per sort order)
+top_scan_rows = 4096              # rows of a presorted permutation checked in the first step of a top-K scan
+
+
+def pack_bits(mask, words):
+    """Pack a boolean row mask into a bitset of 64-bit words (bit i of the set is row i)
+    :param mask: Boolean array, one entry per row
+    :param words: Number of 64-bit words in the bitset
+    :returns: np.ndarray -- uint64 bitset
+    """
+    packed = np.zeros(words * 8, dtype=np.uint8)
+    bits = np.packbits(mask, bitorder="little")
+    packed[:len(bits)] = bits
+    return packed.view(np.uint64)
+
+
+def count_bits(bitset):
+    """Number of rows in a bitset, from a branch-free popcount of every 64-bit word (the rows are never unpacked)"""
+    v = bitset - ((bitset >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    v = (v & np.uint64(0x3333333333333333)) + ((v >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    v = (v + (v >> np.uint64(4))) & np.uint64(0x0f0f0f0f0f0f0f0f)
+    return int(((v * np.uint64(0x0101010101010101)) >> np.uint64(56)).sum())
+
+
+def test_bits(bitset, rows):
+    """Whether some rows are in a bitset, without unpacking the rest of it
+    :param bitset: uint64 bitset (see `pack_bits`)
+    :param rows: Row positions to look up
+    :returns: np.ndarray -- boolean, one entry per row
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    return ((bitset[rows >> 6] >> (rows & 63).astype(np.uint64)) & np.uint64(1)).astype(bool)
+
+
+class BitmapIndex:
+    """Range-encoded bitmap index over low-cardinality columns.
+
+    For every distinct value ``v`` of a column the index keeps the bitset of rows with a value
+    ``<= v``, so a slider range ``[low, high]`` costs at most one and-not of two bitsets, however
+    many values it spans.  Columns with more than ``max_values`` distinct values are compared
+    directly instead.
+    """
+
+    def __init__(self, frame, columns, max_values=512):
+        """
+        :param frame: DataFrame (or dict of arrays) holding the columns, one entry per row
+        :param columns: Names of the columns to index
+        :param max_values: Largest number of distinct values a column may have to get bitsets
+        """
+        self.size = len(np.asarray(frame[columns[0]])) if columns else 0
+        self.words = (self.size + 63) // 64
+        self.all_rows = pack_bits(np.ones(self.size, dtype=bool), self.words)
+        self.values = {}
+        self.bitmaps = {}
+        self.raw = {}
+        for name in columns:
+            col = np.asarray(frame[name])
+            values, codes = np.unique(col, return_inverse=True)
+            if len(values) > max_values:
+                self.raw[name] = col
+                continue
+            # walk values in order, adding each value's rows to a running mask
+            order = np.argsort(codes, kind="stable")
+            bounds = np.searchsorted(codes[order], np.arange(len(values) + 1))
+            running = np.zeros(self.size, dtype=bool)
+            cumulative = np.empty((len(values), self.words), dtype=np.uint64)
+            for idx in range(len(values)):
+                running[order[bounds[idx]:bounds[idx + 1]]] = True
+                cumulative[idx] = pack_bits(running, self.words)
+            self.values[name] = values
+            self.bitmaps[name] = cumulative
+
+    def select(self, ranges):
+        """Bitset of rows whose values fall inside every (inclusive) range
+        :param ranges: dict of column name -> (low, high)
+        :returns: np.ndarray -- uint64 bitset
+        """
+        result = self.all_rows.copy()
+        for name, (low, high) in ranges.items():
+            if name in self.bitmaps:
+                values, cumulative = self.values[name], self.bitmaps[name]
+                upper = np.searchsorted(values, high, side="right") - 1  # last value <= high
+                lower = np.searchsorted(values, low, side="left") - 1    # last value < low
+                if upper <= lower:  # no value inside the range
+                    return np.zeros(self.words, dtype=np.uint64)
+                if upper < len(values) - 1:
+                    result &= cumulative[upper]
+                if lower >= 0:
+                    result &= ~cumulative[lower]
+            else:
+                col = self.raw[name]
+                result &= pack_bits((col >= low) & (col <= high), self.words)
+        return result
+
+    def mask(self, ranges):
+        """Boolean row mask for :meth:`select`"""
+        return np.unpackbits(self.select(ranges).view(np.uint8), count=self.size, bitorder="little").astype(bool)
+
+    def rows(self, ranges):
+        """Row positions for :meth:`select`, in ascending order"""
+        return np.flatnonzero(self.mask(ranges))
+
+
+def filter_titles(frame, ranges, index=None, columns=None):
+    """Rows of a frame whose values fall inside every (inclusive) range
+    :param frame: DataFrame of titles, indexed by catalog row position
+    :param ranges: dict of column name -> (low, high)
+    :param index: Optional prebuilt :class:`BitmapIndex` over the catalog (see `catalog_index`)
+    :param columns: Columns to index when there is no prebuilt index (default: the range columns)
+    :returns: pd.DataFrame -- the matching rows, in frame order
+    """
+    if index is None:  # no prebuilt index, index just this subset
+        return frame[BitmapIndex(frame, list(columns or ranges)).mask(ranges)]
+    # prebuilt index rows are catalog positions, same as the frame index
+    return frame[index.mask(ranges)[frame.index.values]]
+
+
+def sort_key(frame, name, scores=None):
+    """Values of a sort column for the rows of a frame: the frame's own column, or else the issue
+    scores (one per catalog row, e.g. a catalog's score matrix) at the frame's catalog row positions"""
+    if scores is None or name in frame.columns:
+        return frame[name].values
+    return np.asarray(scores[name])[frame.index.values]
+
+
+def sort_titles(frame, sort_list, scores=None):
+    """Order titles by several columns
+    :param frame: DataFrame of titles, indexed by catalog row position
+    :param sort_list: (column, ascending) pairs, most significant first
+    :param scores: Optional mapping of score column -> scores of every catalog row, for sort
+        columns that aren't in the frame
+    :returns: pd.DataFrame -- sorted frame
+    """
+    if scores is None or not sort_list:
+        return frame.sort_values(by=[v[0] for v in sort_list], ascending=[v[1] for v in sort_list])
+    # one stable lexsort over the key arrays, like sort_values (lexsort takes its primary key last)
+    keys = [(sort_key(frame, name, scores), ascending) for name, ascending in reversed(sort_list)]
+    return frame.take(np.lexsort([key if ascending else -key for key, ascending in keys]))
+
+
+class ResultCache:
+    """Bounded LRU cache of query results (arrays of frame index labels in result order).
+
+    Results are only valid for the data version they were computed from: the first lookup with
+    a new version drops every entry, so a reloaded catalog never serves stale ids.  Entries are
+    evicted least recently used first once there are more than ``max_entries`` of them or they
+    hold more than ``max_bytes``.
+    """
+
+    def __init__(self, max_entries=result_cache_entries, max_bytes=result_cache_bytes):
+        """
+        :param max_entries: Most results kept
+        :param max_bytes: Most bytes of ids kept (a single larger result is not cached)
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._bytes = 0
+        self._version = None
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, version, key, compute):
+        """Cached result for a key, computed (and kept) on a miss
+        :param version: Data version the result belongs to (e.g. the catalog directory)
+        :param key: Hashable description of the query
+        :param compute: Function returning the result as a numpy array
+        :returns: np.ndarray -- read-only result, shared by every caller asking for the key
+        """
+        with self._lock:
+            if version != self._version:
+                self._cache.clear()
+                self._bytes = 0
+                self._version = version
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key]
+            self.misses += 1
+        result = compute().view()  # the flag only applies to this view, not to the caller's array
+        result.flags.writeable = False
+        with self._lock:
+            if version != self._version or key in self._cache or result.nbytes > self.max_bytes:
+                return result
+            self._cache[key] = result
+            self._bytes += result.nbytes
+            while len(self._cache) > self.max_entries or self._bytes > self.max_bytes:
+                self._bytes -= self._cache.popitem(last=False)[1].nbytes
+                self.evictions += 1
+        return result
+
+    def stats(self):
+        """Counters of the cache
+        :returns: dict -- entries, bytes, hits, misses, evictions and the data version
+        """
+        with self._lock:
+            return {'entries': len(self._cache), 'bytes': self._bytes, 'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions, 'version': self._version}
+
+
+_result_cache = ResultCache()
+_presorted_cache = ResultCache(max_bytes=presorted_bytes)
+
+
+def result_cache_stats():
+    """Counters of the process-wide query result cache (see :meth:`ResultCache.stats`)"""
+    return _result_cache.stats()
+
+
+def cached_result(version, key, compute):
+    """Result of a query that isn't a plain selection, kept in the process-wide result cache
+    (see :meth:`ResultCache.get`); the key should not collide with those of `select_titles`"""
+    return _result_cache.get(version, key, compute)
+
+
+def range_key(ranges):
+    """Normalized, hashable form of slider ranges (the same ranges always give the same key)"""
+    return tuple(sorted((name, float(low), float(high)) for name, (low, high) in ranges.items()))
+
+
+def _select(frame, ranges, sort_list, index, columns, version, issue, scores):
+    """Ordered ids of a query and, when they had to be computed, the matching frame itself"""
+    def compute():
+        with current_trace().span('filter'):
+            matched = filter_titles(frame, ranges, index, columns)
+        if sort_list is None:
+            return matched
+        with current_trace().span('sort'):
+            return sort_titles(matched, sort_list, scores)
+
+    if version is None:
+        matched = compute()
+        return matched.index.values, matched
+    computed = []   # the full result of a miss, no need to gather it again
+
+    def compute_ids():
+        computed.append(compute())
+        return computed[0].index.values
+
+    labels = _result_cache.get(version, (issue, range_key(ranges), tuple(sort_list or ())), compute_ids)
+    current_trace().tag(result_cache='miss' if computed else 'hit')
+    return labels, computed[0] if computed else None
+
+
+def select_ids(frame, ranges, sort_list=None, index=None, columns=None, version=None, issue=None, scores=None):
+    """Index labels (catalog row positions) of the titles :func:`select_titles` returns, in order;
+    cheaper when only the first few rows or the number of matches are needed.
+    """
+    return _select(frame, ranges, sort_list, index, columns, version, issue, scores)[0]
+
+
+def select_titles(frame, ranges, sort_list=None, index=None, columns=None, version=None, issue=None, scores=None):
+    """Filter titles (see `filter_titles`) and order them (see `sort_titles`).
+
+    With a data version, the ordered ids are cached under (issue, ranges, sort order) in a
+    process-wide :class:`ResultCache`, so repeated queries only gather their rows again.  Leave
+    the version out when the frame holds data the version doesn't cover (e.g. typed-topic scores).
+
+    :param frame: DataFrame of titles, indexed by catalog row position
+    :param ranges: dict of column name -> (low, high)
+    :param sort_list: Optional (column, ascending) pairs, most significant first
+    :param index: Optional prebuilt :class:`BitmapIndex` over the catalog
+    :param columns: Columns to index when there is no prebuilt index
+    :param version: Version of the data behind the frame (e.g. the catalog directory), enables caching
+    :param issue: What the frame is ranked for, part of the cache key
+    :param scores: Optional mapping of score column -> scores of every catalog row (see `sort_titles`)
+    :returns: pd.DataFrame -- the matching rows in order
+    """
+    labels, matched = _select(frame, ranges, sort_list, index, columns, version, issue, scores)
+    return frame.loc[labels] if matched is None else matched
+
+
+def presorted(frame, sort_list, version, scores=None):
+    """Every catalog row in the order of a sort list, sorted once per catalog version and sort order
+    and kept in a process-wide cache (bounded by `presorted_bytes`).  Because the sort is stable,
+    the rows of any filtered subset come out of the permutation in the same order `sort_titles`
+    would give them.
+
+    :param frame: DataFrame of every catalog row in row order (the listing)
+    :param sort_list: (column, ascending) pairs, most significant first
+    :param version: Version of the data behind the frame (e.g. the catalog directory)
+    :param scores: Optional mapping of score column -> scores of every catalog row
+    :returns: np.ndarray -- read-only catalog row positions in sort order
+    """
+    def compute():
+        with current_trace().span('presort'):
+            keys = [(sort_key(frame, name, scores), ascending) for name, ascending in reversed(sort_list)]
+            order = np.lexsort([key if ascending else -key for key, ascending in keys])
+            return order.astype(np.int32) if len(order) < 2 ** 31 else order
+
+    return _presorted_cache.get(version, tuple(sort_list), compute)
+
+
+def first_rows(order, bitset, limit):
+    """First rows of a permutation that are in a bitset, without looking at the rest of either: the
+    scan checks `top_scan_rows` rows (at least 4 * limit) and doubles the step until enough rows passed
+    :param order: Row positions in the wanted order (see `presorted`)
+    :param bitset: uint64 bitset of the rows that pass (see :meth:`BitmapIndex.select`)
+    :param limit: Most rows to return
+    :returns: np.ndarray -- at most ``limit`` row positions, in permutation order
+    """
+    found, count, start, step = [], 0, 0, max(top_scan_rows, 4 * limit)
+    while count < limit and start < len(order):
+        rows = order[start:start + step]
+        rows = rows[test_bits(bitset, rows)]
+        found.append(rows)
+        count += len(rows)
+        start, step = start + step, 2 * step
+    return np.concatenate(found)[:limit] if found else order[:0]
+
+
+def select_top_ids(frame, ranges, sort_list, limit, index=None, columns=None, version=None, issue=None,
+                   scores=None):
+    """Index labels of the first ``limit`` titles :func:`select_titles` returns, and the number of
+    titles matching the ranges.
+
+    When the frame is the whole catalog (the listing, with a prebuilt index over it) and the data
+    version is known, no sort is needed: the rows are the first ones of the presorted permutation
+    for the sort order (see `presorted`) that pass the filter, found by an early-exit scan.  The
+    filter stays a bitset (never unpacked into a mask of every row, and cached per ranges so every
+    issue asked with the same filters shares it) and matches are counted by popcount, so apart from
+    the bitset words the work is proportional to the rows returned.
+    Otherwise the full ordered result is selected (and cached) like :func:`select_ids` does.
+
+    :param limit: Most labels to return
+    :returns: tuple -- (np.ndarray of at most ``limit`` labels in order, int number of matches)
+    """
+    if version is None or index is None or not sort_list or len(frame) != index.size:
+        labels = select_ids(frame, ranges, sort_list, index, columns, version, issue, scores)
+        return labels[:limit], len(labels)
+    with current_trace().span('filter'):
+        bitset = _result_cache.get(version, ('bitset', range_key(ranges)), lambda: index.select(ranges))
+    order = presorted(frame, sort_list, version, scores)
+    with current_trace().span('top_rows'):
+        rows = first_rows(order, bitset, limit)
+    return frame.index.values[rows], count_bits(bitset)
+
+
+def best_rows(frame, columns, tie_breaks=(), scores=None):
+    """Best (smallest) row of every score column, from one argmin per column instead of a sort
+    per column.
+
+    Rows are first put in tie-break order, so among equal scores the argmin picks the row the
+    tie-breaks prefer.
+
+    :param frame: DataFrame holding the tie-break columns, indexed by catalog row position
+    :param columns: Score columns to find the best row for
+    :param tie_breaks: (column, ascending) pairs deciding between rows with equal scores
+    :param scores: Optional mapping of score column -> scores of every catalog row, for score
+        columns that aren't in the frame
+    :returns: np.ndarray -- index label of the best row, one per column
+    """
+    order = np.arange(len(frame))
+    if tie_breaks:  # lexsort takes its primary key last
+        order = np.lexsort([sort_key(frame, c, scores) if ascending else -sort_key(frame, c, scores)
+                            for c, ascending in reversed(tie_breaks)])
+    rows, best = frame.index.values[order], np.zeros(len(columns), dtype=np.int64)
+    for idx, name in enumerate(columns):  # an issue's scores are one contiguous block of the matrix
+        if scores is None or name in frame.columns:
+            values = frame[name].values[order]
+        else:
+            values = np.asarray(scores[name])[rows]
+        best[idx] = np.argmin(np.where(np.isnan(values), np.inf, values))
+    return rows[best]
+
+
+_index_cache = {}
+
+
+def catalog_index(catalog, columns):
+    """Bitmap index over catalog columns, built once per catalog version and reused across reruns
+    :param catalog: Catalog (see catalog.py) to index
+    :param columns: Names of the columns to index
+    :returns: BitmapIndex -- index whose row numbers are catalog row positions
+    """
+    key = (catalog.path_dir, tuple(columns))
+    if key not in _index_cache:
+        index = BitmapIndex({c: catalog.values(c) for c in columns}, list(columns))
+        _index_cache.clear()  # only the current catalog version is worth keeping
+        _index_cache[key] = index
+    return _index_cache[key]
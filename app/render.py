@@ -0,0 +1,119 @@
+# HTML rendering of title cards, shared by every page that lists titles
+import threading
+from collections import OrderedDict
+
+logo_hbo = "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAV4AAACQCAMAAAB3YPNYAAAAflBMVEUAAAD////IyMg+Pj42NjacnJzy8vLj4+NpaWnBwcFaWlokJCReXl78/Pz29vbV1dXe3t61tbXOzs6NjY2WlpZjY2MVFRUQEBAhISExMTEbGxtGRka6urp5eXnp6eni4uKDg4OkpKSIiIgsLCxLS0usrKx8fHxRUVFwcHBBQUFTYdewAAAKVElEQVR4nO1d2YKqMAxFFFSUHcVd1GHg/v8PXh0WdWzhtAJDkfNMmnLENE2TVNIxDGhglAcfZ5zE+9ANVTVDdxINL0vflyTf36y3WuxNj6pq8CuWFAgeTd7wIPkwe/6E6SPiFO5kx7QOVdNsHJ3pWZtJFKwnJ9k88A1NG/M3aPIqJr7Onr+gCmlY/Vu44c7ie1sCDOcURMsyrZe5Z5sco6NvRZMH6R1mz49QhYVYfcWuw8XmL5jeAp2Rv4095l8VfSGa/N/Qe8Pm33nMy2oCQxmu2HTOtCmbCnRgmvzf0XvDaKfyGmLVWfDpDA7Gp9B7HfjEYxIH46nGrzOQ1U+h90Yw86quhm+Qe8Vyb38MvZIU7djYPUX+uyqXMbayouO1mV5JmjB8wOZXJSr9GNGJjtZueiVJBsm19tXpPJWbYHSottMrhchyY9jDKnXOnTK/BR2p9fT6QTm/1nfFSi9eiVJ0oNbTezXAZf6ovK1eqVZsgdFhBKBX+ip8U92rR2uh1UcHEYFeKS4whYf3XN0CnAsMBDqGEPRKCpVfuU6rRI/0oEOIQe+KFnGx13Wqjaj8oiOIQa/0RQ6ieaUB3fcwovGLDiAIvdKZZB6q9sdeQfvboPKi0Cu9xgLUc906r5iRgzyouDD0Ri8zDOpW+YMVkV9UWhh6pV/xX92tXWMCon1AhcWhd/I8wabYve6QCesbKisOvc9veapd3x3r14MTVFQceqXHnIxp/eoe8Or/opIC0RvfQztmA+oeMfm9P0YFBaL3X/4fPczr1/aMoPv0+pmL1JjT8IBf7hkqJhC9kpLqshvQ9YLn5Q2VEonefWIBrQZUvSJ6iq+jUiLRG/3EddSoAVUEeI9RD1RIJHrXP/5RTYcTpVg9Rj1QIZHo9W/2T3471ZUX2oN3hsqIRO8tanaYNKGIDOVODyrSIL1zjYAvavI4AVd6Q4bHK8d9dUMlGqT3MCbAckI8A8QZHHj/JTNt753CnR0q7mTLm4oWt5lemqoxvEtwOONkE9saH9KMYd1QD0dT+cczzjI/nEclWkAvHv5yDPDBB6wm5IQFNfxiP6ibZM4ZKtAKenUw/85kPlyLlIJsG3PPmpm2yfbGqEAr6B2YmLd1Yjx2j8pyHU2XccRYFZHeAZRqsxwyrUlLpbwERjfZEld9WUh6FUTZhond9RGqfjHYAkTfhoj0muh8YTxFaA3Dcefrn1/HH8Yn66ncdcxUSmSJSC+HS1CI9UN81jBfKlqWsfzwbRss7t63iPTC8wWndQ+/GHJArCHceg8hGsg2pejpXd2PHqcxddc9Cu5LH8NeeycgvdUah5xd/XtT9NzolE8AP9jXBKRXRucL4J4QMS2NF2n5szC/M0s8eiuMkc+ypCVDARy5ZZ7iBK9vinj0VpjBnx3a6AH2fH7+jM7hFnhAJ9MOesFNMQItSzZBt2ObrKOKBe5abvkW6GzaQW+FedBZlCGAJfysdBncv93yLdCxaS8MLuXV0FvhEUT6KbJlmqSBBBX84F0dpleekgH+kpXQG7IcCBVDSw2vzRSeuKQOsIPFz7RxxbsgKiqgV62y/iT1A46Mgdw0dxhcDWemMPRaXpVlf1k4lrnfS2pTwCVWbiO9lxkBlVZOZUl+7Nm/23R7EUNPKzqzAj40m+dQhnly8qNz1BK66Z8JenhRdYCPhnbRm+avhxwH7cM0AxL6Zdag2/o2WkXvJaFI5UquPiU+BxZ66Bi9I2j926aWl8vP2yaG5QA93FQObEP0ulABZmo/OcNDSXTdgBoe7fhUMKMZel0V8rQS22BxdoRKMpx06OCiqSTYRugNBkeonUsyE4dTyzIRhyLPmP/2Ppqg1zMGFuLuX1K/gVdPYnxNxBOvrQPKL9RP79K+Lulm4ZlOikViPLmjb8mexEKS+2rojURE3fT6i59vCkqDSLxelbsZX5IZAeVnN5UhXy+9l8mOwZ4mX98B+dCJmCdffwA8yq2DEXXSq3nTLNUDotdhcFxJSNxmKFJcc4+ZHHXRu3Z3zkMCHkSv9Sa96bsgntnbnVZB1EXvcv+U3QjRy7LtIiFts99kK4My1Ggc1rba01vn0jYKDyz09saBFXO7X9pqpFdang2Y3oocM2Rb0gXHLMH8tsY1ua1Aokfd2FYkKpx+U1xnSGdoYiGdWTKTPqTDiK067gOSNSKGDGI14XQoUt6pcPp11ekPg2pVAx3+9keZ3ED2Sf1BPC98aBvap5HUij4JqlZkKXzsdUZZCh/WqaeVKXzxhACt0st+PjkBdUCCYYacly8SwZk+nTbJ6V769M0XQurPQOTJ/0whw0saV64++V8ltWcajw9gB4Bme+kAaKJ0xcNLV2hv3Ghl0KDCKxKyA44AlviLwqtm69qs6u6mifqywVdU2LqQseg1/3Z1tLNqLFzRa5WFg7OML6hke5V3OetyyXaVMZJZ3ihaLg3uzD+j4QCyDcLdN7hdRphPoNvtMpD54q7sU7MX6kZsFNw79HW82Qsy3xV+/D2694005IBoIj6qVRGiLmLYPV+eGm3Zv48eN7HzUY22kBhXwOReuI/DG4aZtYlbDuPT8Y02cUcR6UW+n2DMdEi5tvomhxkQl/6bce/sK8dScnWT7UzdTw02+nw76IXirN8Di/GQsrB7749elzGdScwGswGiK8DjCDkir2+PPNhBLteZq1nfakG+rPVzmnvLWLzsdg7M15p+Eb60puc6gxKxNb1hY/bPP92mxXs0t4r27tsXK+zzSaMSf03v2EYTRhO7118LQsNiTsAW3unOfnwitb/Uph6MEp+ov5KpHqQJen92odis2xeKZddA99fh1YLc8v3NZY7a0w0jqJQ49N7vAu2vIq0B97lhCfrVInymBxUThl7tYXJYqUWV6Pw10E/3MPeXmFeN58hXlTcFlCN6CRyjkqLQOzGe59dUbc4Na/M3O52j9+XKwObch/s9GJ2lV3u5ek1XGqr6X5HixaiwIPQqrzNkOj7nx8p+Vd01ereE/2cz/M6I7HaMXpc8yfq3F0TL0DV6t7SMBbvmtiAj0r+mc/RSPqErdtWltRMQ0djtFL172iSvkGtUPKGnoaBDCEDvV2EuyLi28G9QcMkxOkb76V05tDkm4G+eUwyyy9A1ejc72hRz7JDuQox4DTN0k96QNsMHWFV/wBev5PZzdKC201v4F81h2JVWfs+dstxVdKSW04uxe4XFnN1Hx6nk0+0KvcOSVe0JJnf7vSf4cUnSamfo/UZe9AGn6O3S+mWM/aLoeO2ldxtCyftPkw65uhTl2OxRY4SO2FZ6Nx51Q1qEw/QNggO53Oh2g17vwPzpZhN3OJP8zgejfPQO0LvaKrzcJjCU4YpN5WxOjxoRgQ5Mk/8jev3hwmVxF2gwvQU6o+U2ZjdE6PvQ5EF6L9nzjJ8LAf46+lbsUoceheGE56j0OO4y92weIy/JGGjy+hQSz780B9RHH8kxjwzGD4F+NKfunFqsNZqcZJPR98tQXCD9OdANVTVtN9b+XTa3Tom+v1lv53tlelRVg/+f8h9RlqixRug4RQAAAABJRU5ErkJggg=="
+logo_netflix = "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAARMAAAC3CAMAAAAGjUrGAAAAkFBMVEUAAACxBg/lCRO0Bg+GBAynBQ4GAQKtBg6CBAqsBg5PAghMAwZlBAnsCRXoCROqBg+hBQ+WBA6NAw2bBA6LAw2TBA59AQ3iCRTcCBPTCBOjBQ7HBxO7BhHFBhIYAQNgAwkwAgU3AQYhAQRuBAp2BQoWAgNVAwhEAgfXCBRiAwsrAAZFAQc+Awd5Agz2ChUkAgWS0IwvAAAGhklEQVR4nO2dfVPbOBDG/Yrtgi1bsk3imFKaEDgauO//7U6SQ8iLV7Q3196Mnn1m+leXGfobPbva9doNAhaLxWKxWCwWi8VisVgsFovFYrFYLBbrQvc3hNbf5sIfrint/vAv/hv1XBJ6G+bCkzGe1yj/9G/++xRX0byq57nwPA7nFSd/+jf/bbqqCSRRVN7MxGMwWVJMqnAmHoJJGpLmWXy/jMdgMtyS5llfxmMwESvyoIyX8RhMwrokD8rXi3gMJrFakEzyi3gQJsNImSdaXcRjMAkLRTIpLyoPCJOseSaZXFzYQZiE6hfu9yhMBkWdk6i6PotHYVJ0S+qglOosHoVJprKfNg8Kk7DuyPt9dX8aD8Mkbcn7fZmexsMwKZqUbo5P7/cwTLK6pZvj08kSDJNwaO/IgxKfxOMwSRtFNse3J+bBYSJUTptncxyPw0QnFLI5Pp0sATEZuo6eLD0exeMw0QkloZvj438tEBOhWro5Xh7FAzEp6q6jJ0sPH/FATDJtHrI5rrqPeCAmYapaQWbZo+YYiYmopaSb4+0hHolJUTc5+eS4rA/xSEx0Qmnp5vj56j0+J5B4yUQomVDnJCoPkyUkJqYa5/ST48PaBRaToWnpJ8eHtQsoJlmqZP/5ZCkPMyAmou76zydLPRYTbR66Oa72zTEUkzAbtHnotYt+iu+LAohJkaoupydLd1M8FhOTUBLaPG/TWLYXxbx5PGUyNLKn7/etjX/VTGaheMlkMg+9GTpNll5T4qD4ycSaR1LnJKqeTPwmFQKLSdP29GTJrl1sBn1QkJgM2jzCvXZhmcwdFD+Z2ISS0E+O7WRpXQ9YTLR5ZE+vXZgXejSTVMxVHk+ZmIQi84E2j77fr1U9n1B8ZWLN01PesZMlzWSYrTyeMrEJpXU3x2tlDgoSE2se59rFulHzWdZXJrYaJ6+uF3puGqWgmITFYMwzUkyqMbjp9EFJgZjoJGvM41i7CP7quvnK4zMTU3nItYsq30p9UObM4ysTm1B0z0OuXUSrL61sZg+K30xkLum1i3VimVxO2/xlYhKKzrL0O8dx3lrzXFzvPWYialN5CvKgLPp2vvJ4y0Tf2ox5EsfaRZPLqfJkKEwO5qE3Q81BmbnK+s1EdbIn1y6iRW6z7EUf6D2TJKHNU+/NA8PEVGNrHnrtYrU3z1nl8ZnJ/qDQaxe3iTHPcF55vGYyVR56slQNk3nObm0eM5muss7J0mSe8+u930xMNZZJQ5onmswjYLxjEspkHnqyJObM4zWT98pDf+1i+dpiMbHmMQfFMVnam6dAY9I6JkumOcZiMlUe2dPz+0WfmMoDxWS6tm3p+32Xy+ZsXuA1k33l6doX8ooSmeb4rBr7zkRXHp1Rvq0/Mc9JQsFgsvtOm0dN5oFhEha28nQ7xzdD74x5ThKK50wyYa9tu8BhniQ5SyieM7FDFKV2QUAhsZMlnVCQmJjKo56CgB5B6ub4tBr7z8QcFM1k65os6YQioJikdW32YenmOO1lMwAxMT3PYJmQI8hqacwDxcSY54f+6x39Qo81T4HDxF5RDJOAfvhV9FINQExMH5haJpK+oryeVGP/mRT6oFgmD2Q1rmSiqzEOE5NQhGUSODZD8+OEgsFk+iRo7miOdTU+3Nr8Z6IzSjYxeXCsXSRHCQWJSeD4IFffKSQm4YHJpqKgLHL5kVCgmDw61i6SZkBiEobvn112TJby7pBQsJjcOJpjqTCZkJOlqqyTQ0IBY0K/+bXKmxqTybVj7eJgHgwmXw5Bz+Rrk6JVKSYT+snxsm8GICbxBxN6slQmuhpDMgnozdBYmweTSUt/CjJvpoQCx2RHIYmippuu93BMHJOlMZkSCh6TV8eTYwXK5MWxdtGlmEwck6W7ts4wmTjWLqQqMJm41i4aAcqE/q+cVu0AysSxdiFNQkFk4li7EA0qE8fahRSgTJ7otQs5gDKh1y7KUKEyod/8epYZKJMdvXbRpKBMHJOlsUZl4li7aDJQJo61i0GAMnFMlu5SVCYb2jw1KhPH2gVqPnGtXawEKhN6snRboDJxTJZGf5nEe43juJ0JL97e3sqyrKrK/Dl20tInJvE7iDAOhZL5ZrO+3+5evl7N/8Dj3w9f1nnbKDEuF5GBU1o4lUdMhPmSbrK52T69/Isff9zdbxIVrxaLavjPf7f/S1dP34gD8Wv6/uP68yAWi8VisVgsFovFYrFYLBaLxWKxWCwWmP4BmvyYsLbiAjEAAAAASUVORK5CYII="
+logo_youtube = "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAT4AAACfCAMAAABX0UX9AAAA81BMVEX////+AAAkJCQAAAAZGRkLCwsiIiIVFRXX19eFhYXq6upzc3MSEhIYGBjt7e3//v+VlZX19fVqamrxAACurq4dHR35AAB7e3v/6+nQ0NDFxcWhoaH6//+np6fi4uJ1dXXsAAC0tLQyMjK+vr6IiIhBQUFeXl5WVlb///gsLCzlAACZmZlHR0f+9fb7wME6Ojr63d3sdXZPT0/91tX4ysryvsDrra3spKLtmpjwj43zhoT6eXbyamvvYGDvV1rwUFHmZmjhUEroMirwHx/oc2/mNjjpg3rqgYTulZj65Nz2YWPlp6fsQkTwFxjvpKD60czuMjXbvwEhAAAMM0lEQVR4nO2cDV/asBaHK6UFEay1FgGRoSJDFHxDfJnopvPO3c257/9pbtKc06a00OCoc9fz329qX5M8TXJOTtJqGolEIpFIJBKJRCKRSCQSiUQikUgkEolEIpFIJBKJRCKRSCQSiUQikUgkEolEIpFIJNL7lBX5I3w4fjcJxPHUvb86/JdlBTv4MYvvAIaWp+Ay+RbRve9FgMR6eUXr4EOozy1T/4rqrPAgq9erHJ0Ozs6G5xeXV8efPl1fX49Go5ub29ufTLe3tzc3oxHbef3p+Orq8eLH8OxscFrp9fxbvT91WMXpHfV/XX3+ctdsOlxlXwuxCo6zk5vNZvn+5+j4YjjovUuAR5f3XSce1ESVF8rS3+JXs3l99jY7v0YVNP/sff/anFDJXiDnoa9ZdSu2Hcdm/XVwr+ug5XnelRdz0J0fvAVeBf9jdRg8C/nlUXaQ7DLua8yc5UZ+ouzJVy3mMp7mio/VEuuouzCxi3sRvrJzyWw4wrO0j/jgJVSbuG9j5jz79SiqwuSrUsHHbcYDZzc/fNycNPv1gJ+2ZoicG1tBwh9KUJrZax+CiMp4bXxM3xxmA+bZejm/+0onwNfQRc5zi0Gq26a3y92ePcNvCZ/XdOfIDhFeCvMhdChYmQd+sstAtLQYm6upekP4rPrjXGuer989KZWWyLrp+l17DfDptdnz/Kbw3aQBj7kv3yWHxIeVxz0rRdgzxVZOUgw+qN2v33h79+U0Gu9C+Uxy/OycKJ+xiXs+uqLra78gy2h5DdevdTGmfVzp4KvMOtZQxfdY7wTVD2iVlnAHVEdjdreFtRjbi/rY2lIWiBREHMiaVpXTwTdw5mt2fXz/lVPZF23VPITtfKQ1v0QBPoWT08H3IxXDwfRTTgVxYecEnqC590cjtjeA7yotfE+y6dX2zJChXRdOc2n9j/L+BvDdpIWvW5FjBkui8yuuiE2kufNHeX8D+B4W5jlgk+QM5GS2DNnSotP8h0X5+/h6T8kgyg/IdxbO5aGcTgE7O884gh/ofpTOsAuNRmE2L/BP8LHkYjnay43GsnI2Kt1kKE5l+MRDMjOGZX6FEoJxm/DMwGku7uPR6uLhXknXS5nDxap00RpoU5QnvwmbVWFxxvBV8bAw5/YmXh7Ft9PeM3R3uzVGsNo62HMNw907XFcbDbERb6KcSr33rVueNbBwFUoIiImgC7iB6LbkD/ScycSrZ1E/CXzfom54ghqziZvQg47ha+Fh4ZzbuKmP41tu6y5LzDRzJdlxarT1osiGaZb0A5VQ0KCpgq9j1Y9GzRlr3+dQQlXRXkXQpWhKLZk1ZX/4wJV1/TKBhcGhHQa+ivH4cCBorAE+uGEphM+wC3v+qI9nAV2nHT0bykZWwSftK4T6nAqPqmqDh9n4jUIJWWA7TjQ/gJVdlcEGcl188Jl54DOzIXzFxrb0tIq+65SPZCOTbGSGavjY+JV5IeeiqqoxLN+GU2q78PB9Mywasm0EOQZa7m6K+DLtUCXzh8mHCNXEQ7nVRHznCiA8fJrFWnDvuFsuq3aCD+EBxaYou85Mw2JJKvVSCQti6CXEtZEiPjfjciMFwlH3DpydNdwcPtDpQ0qL/XtUx1dn/OqnX5THyPehYQe2WB502fUetOsFT9EFzBS37MIKuDc4Nk4FX8b4UM0vFhEmOE8HEALiFmNLD6czAR+rHlfK+Fj31+HzZ/3fTlkpxtUM49M8y8rHabZ49LkV+akLJ2YVgTTSwyeiZkuwaW7LDxcqHNzYndp6ee1Tx8d6P4vVQK3eu+gq8XPG8Ikmy+ocdNK65+Gt45SRhwDjqjCplAY+MFhoKSDECl2LuevNnoE1M81pAQ2O71gZnzfvzS+pa5WvCu5OBJ+oZ2bREpbDND0mMGUEzdWfAllPDR92aNumvL2ek9kW9NCNJ0sdn4xde751ykmd4Dg+KI7eWMkFOV2GQmE7AQKef5MOPgPcEfAEIGyx68qPzUJ88hBobvh4Nzi8cxJa8Dg+GGsYNZFxUUhsQziHCT24mUsdH040F72zs2bozjpMLkgT03PDp3E7Uu89Ps2IT4Scc/ti+CuswxbOoIP/sIp1YjktfBhxwbOLPOWCIW1oaOb8zbniq3uLTbXe9WyNF2qaue3lzD30RksbiG9zjEg+bXz7iK+lBYa3CNmA0aJ3bN74xBTa+X3CGC6CTyv5Dj2rhC0P3wo2Kcg3ei5GLW18YGtFd+dPJkA2ID6US5rEnxWfxetehw2AfyZ6LuN+X9DdeKWohQrlN17Et5M2PrxZls/+1cbwgVlOnEyYEZ8llvEeXasEaiL4tqThbVEQWZ+AT381fKVXxOet4+09dlViL1F86E5lgrHS38OHzzL7Qca3FsaX1HhnGHVw8VVTw6RObyI+9K4kXBA9+Iu1L4TPPFnytCc2p/V9vBvTLmfExxzm5rQV4/Jl0RFPyx+2o+//1vCZWU9mMj4+iNUu1PB1uKfHflaOVYZrQvdRfJhLhkV7k/jGNB0f+z9cSI6XOpW6F29R7fRAD1F8NoaJ/D75H8bHNVSg4VTYMI0ZXBGqUp6t/BKTXHigqQUBl7eCzy3J0pMsb19hgRWrfWyYcTri7VZ5NVt5bKooTMuP474xfO7H9Q+SlvwFdVF5r6+dKs20adr3b00kp9Z8ywvH/yA+dFxUVVGa5+38egJ0KuTgzEsVfJFRR6h1vzq+4pTqFqdeMxmJ8+vBecE6mHMVfC0s8tiYV09/zAtne+ahOjbqUNadSthdyc8bv6ivgm9/DB/Ou4lA5atEXPjNxkMGyrpVbJEz42seqeBbGw9Yhd6WSRMfuvBee22MhR13WvtrO7XqtJe8hK4VuLzoraNowCUOH3Y6OYisnWDf5zmNc1mkMQEf9rJeRNlGlpCNDd1bHJO8/vDRSW6XL3pnK2bQEYOvYQhCWVg0Lg7jOoM0a5//oKrSg0J3Hm6VjG+YNGXxUt3GpRbBZ7nwctZJqMhAM4f4Cir4Wjh7sTENH8x1WJnQvaEu4owVbCa/tHPqpLQ6N87ti+LzK0HJq2C+BRQETCyimPEK9fZRfFj7oAoVpuLzgwQZW7o1rq4pmmPZnCCrlxK+8o+495yj+NBzEQ+6FTK8OO8GvPIY7pqAD8PvsHAAB4hj+HLroccGgUd8bixjlrSVZDos6yEVegvOsxo+XKRhbjNbW0MAJfFFDzzddKt2YS1n4gRYPD5/pZuxYtvVjxieiCzSaO80am1/K7wayT1h92pAXDK0eHiCvqaDrxyd3YzFZ2EDNXMnuxjMx1V3W36Ay8johgmTdJPwWX7YpFhydTdj7sXiy7jMpvpxW1ygtg9pu6WTXTya7AVa9f5LRhQJ6Jg1Gln1mI8ZRPFpa36hXX8irlQQNdcO4kj8WBFqZzw+S1uVpqJY4fdF840uUJPkv1RnGZi6nw1c/TpVHZVxx8z0moO6kuPCTloyMmGZgb+wnpP26xtQVSfUvvA61dIBpGaGFueWWh+K8j1927o2HvIzVV6W7dXP5vgVDR/gZ+ljBtPwcbX9Bw/ZDsIeDalM+iLakkn4tJNg4WhuexmHtaHaZ+zYhwE/OaDX4u09SM7VVaIvfL5jzi9Vsqdx15O/pCHhM8RcQtgjWNdzZpDrkuyrrmE/lNX3efM0XH71CryYgHdDfIVt7MH0E9tbc86OuobAxy91+bn2qndTkz2oUDh0xzT8jtjVd5OWBwl8DOBo3q3XG+9aMc13f1WoHV7131jZwzdyTzbDHU4ePsOx6gFfE5dDvVjBu/nryOyWOHvXO6PQFse9Q5urwUatLc7aCjsH9sYJZmN1hrfcrStntlioXNHge0x4MbuRc3ca2/FNld2o1mrVRsx1dr5Wy6vfr1HdqSYvibca1XzcWTwb1fj3jSbfq/583eXusxyYUuGIn14qC4jeT+fuPK7X+79WXatcjH53IbAXie4lLsYVVznd+9vLATennfcEkBlJz0nrHZ32f118Ox7dPtzdP4kvqaHK8FE13IbvrDWf7u9+/7z5+u3xYvh8hC+AvLNPIPKZtPEid3qVyhHT6enp82Bwdtbv94dD9uPsbDB4fn4+5ceOKr0IKO8Liu+p8s1LVuyfJBKJRCKRSCQSiUQikUgkEolEIpFIJBKJRCKRSCQSiUQikUgkEolEIpFIJBKJRCKRXqD/Aa3/OpKn7WcJAAAAAElFTkSuQmCC"
+
+score_list = [("Positive Messages",'positive_messages_score'), ("Positive Role Models",'positive_role_models_score'),
+    ("Educational Value",'educational_value_score'), ("Violence",'violence_score'),
+    ("Violence and Scariness",'violence_scariness_score'), ("Sex",'sex_score'),
+    ("Sexy Stuff",'sexy_stuff_score'), ("Language",'language_score'),
+    ("Consumerism",'consumerism_score'), ("Drinking, Drugs & Smoking",'drinking_drugs_smoking_score')]
+display_columns = ['imdb_id', 'title', 'summary', 'avg_score', 'hbo_url', 'movie_trailer_url', 'poster',
+                   'age_child', 'original_release_year'] + [v[1] for v in score_list]
+card_cache_size = 4096   # how many rendered cards to keep between reruns
+
+# card template, filled once per title with str.format (lines are joined with "\n<br >")
+card_head = ('<div style="width:100%;">' + \
+             '  <div style="display:inline-block; width:20%;">' + \
+             '    <div style="display:inline-block; width:50px;"></div><img style="display:inline-block;" src="{poster}" width:50px; height:100px;>'
+             '  </div>' + \
+             '  <div style="display:inline-block; padding-left: 50px; vertical-align:top; width: 50%;">' + \
+             '    <span style="font-size:12pt;">{title}</span><br>' + \
+             '    <span style="font-size: 10pt; color:#a1a1a1;">{summary}...<a style="color:#a1a1a1; font-size:8pt; font-weight:600;"> Read More</a></span><br>')
+card_details = ['<span style="font-size: 10pt;">Recommended Age: {age_child}</span>',
+                '<span style="font-size: 10pt;">Release Year: {original_release_year}</span>',
+                '<span style="font-size: 10pt; font-weight:600;">Presence Scores (out of 5):</span>']
+card_score = '<span style="font-size: 10pt;">{label}: {value}</span>'
+card_links = (f'     <br><span style="font-size: 10pt; font-weight:600; display:inline-block;">Watch now it on&emsp; </span><a href="{{hbo_url}}"><img style="width:35px; height:15px; display:inline-block;" src="{logo_hbo}"></a>' + \
+              f'     &emsp;<span style="font-size: 10pt; font-weight:600; display:inline-block;">or</span>&emsp;<a href="{{hbo_url}}"><img style="width:35px; height:20px; display:inline-block;" src="{logo_netflix}"></a>' + \
+              f'     &emsp;<span style="font-size: 10pt; font-weight:600; display:inline-block;">Watch a trailer on </span>&emsp;<a href="{{movie_trailer_url}}"><img style="width:60px; height:25px; display:inline-block;" src="{logo_youtube}"></a>' + \
+              '  </div>' + \
+              '  <div style="display:inline-block; padding-left:30px; float:right; vertical-align:top; width:25%; padding-top:30px;">' + \
+              '    <div style="width:100%; padding-top: 10px; color:white; height: 150px; background-color: #a6a7a8; text-align:center; font-size:10pt;">Average Acceptability Score<br><span style="font-size:30pt; color:white;">{avg_score}</span>' + \
+              '    </div>' + \
+              '  </div>' + \
+              '</div>')
+card_template = "\n<br >".join([card_head] + card_details) + "{scores}\n<br >" + card_links + "\n<br ><br >"
+
+# landing page heading of one issue (followed by its trend chart and trend_tail)
+trend_head = ('<div>' + \
+              '  <div style="display:inline-block; width:50%;">' + \
+              '    <span style="font-size:18pt; font-weight:600;">&emsp;&emsp;{issue}</span>'
+              '  </div><br><br><br>' + \
+              '  <div style="width:80%; text-align:center;">' + \
+              '     <span style="font-size:8pt; text-align:center;">Trending Activity:</span><br><br>')
+trend_tail = ('  </div><br><br><br><br>' + \
+              '</div>')
+
+_card_cache = OrderedDict()
+_card_version = [None]
+_card_lock = threading.Lock()
+
+
+def render_card(row, presence_mode="Text"):
+    """HTML card for one title
+    :param row: dict of display column values for the title
+    :param presence_mode: How to show presence scores ("Text" is the only mode so far)
+    :returns: str -- HTML fragment
+    """
+    scores = []
+    for label, name in score_list:  # loop through each item
+        if name in row:
+            if presence_mode == "Text":
+                if row[name] > 0:  # don't include zero value items
+                    scores.append("\n<br >" + card_score.format(label=label, value=row[name]))
+            else:
+                print(f"PRESENCE MODE {presence_mode} NOT AVAILABLE YET")
+    fields = dict(row)
+    fields['summary'] = row['summary'][:200]
+    return card_template.format(scores="".join(scores), **fields)
+
+
+def render_cards(catalog, rows, presence_mode="Text"):
+    """HTML for a list of titles as one payload; cards are cached by (imdb_id, presence_mode)
+    for the current catalog version, so only titles not seen before are read and rendered.
+
+    :param catalog: Catalog (see catalog.py) the rows belong to
+    :param rows: Catalog row positions of the titles, in display order
+    :param presence_mode: How to show presence scores
+    :returns: str -- concatenated HTML of all cards
+    """
+    keys = [(imdb_id, presence_mode) for imdb_id in catalog.values('imdb_id', rows).tolist()]
+    with _card_lock:
+        if _card_version[0] != catalog.path_dir:  # new data, old cards may be stale
+            _card_cache.clear()
+            _card_version[0] = catalog.path_dir
+        cards = {key: _card_cache[key] for key in keys if key in _card_cache}
+        for key in cards:
+            _card_cache.move_to_end(key)
+
+    missing = [idx for idx, key in enumerate(keys) if key not in cards]
+    if missing:  # one columnar read for every title that still needs a card
+        columns = [c for c in display_columns if c in catalog]
+        title_df = catalog.frame(columns, rows=[rows[idx] for idx in missing])
+        for idx, row in zip(missing, title_df.to_dict('records')):
+            cards[keys[idx]] = render_card(row, presence_mode)
+        with _card_lock:
+            for idx in missing:
+                _card_cache[keys[idx]] = cards[keys[idx]]
+            while len(_card_cache) > card_cache_size:
+                _card_cache.popitem(last=False)
+    return "".join(cards[key] for key in keys)
+
+
+def render_landing(catalog, titles, presence_mode="Text"):
+    """Landing page fragments, rendered once per catalog version (see `bundle.load_bundle`) and
+    sent as they are to every session that hasn't moved a filter.
+
+    :param catalog: Catalog (see catalog.py) the rows belong to
+    :param titles: list of (issue, catalog row position) in display order
+    :param presence_mode: How to show presence scores
+    :returns: list -- (issue, heading HTML, card HTML) per title
+    """
+    columns = [c for c in display_columns if c in catalog]
+    title_df = catalog.frame(columns, rows=[row for _, row in titles])
+    return [(issue, trend_head.format(issue=issue.replace("_", " ").title()), render_card(row, presence_mode))
+            for (issue, _), row in zip(titles, title_df.to_dict('records'))]
@@ -0,0 +1,303 @@
+# Vectorized issue scoring: distance of every title summary to an issue description in word-embedding space
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict
+from itertools import chain
+from os import path
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from catalog import staging_dir
+
+embedding_manifest = "embedding.json"
+re_token = re.compile(r"[^\W\d]+")  # runs of letters, as gensim.utils.tokenize
+score_column = "inf_dist_summary"
+topic_cache_size = 32   # free-text topics whose scores are kept (one float32 per title each)
+
+
+def tokenize(text):
+    """Lower-cased word tokens of a text
+    :param text: Text to split (None/NaN give no tokens)
+    :returns: list -- word strings
+    """
+    if not isinstance(text, str):
+        return []
+    return re_token.findall(text.lower())
+
+
+def convert_vectors(path_vectors, path_dir, dtype=np.float32):
+    """Convert a GloVe / word2vec text file ('word v1 v2 ...' per line) into a vocabulary file and
+    a .npy matrix that :class:`Embeddings` can memory-map; only the first of repeated words is kept.
+
+    :param path_vectors: Text file with one word and its vector per line
+    :param path_dir: Destination directory for the converted embedding
+    :param dtype: Storage type of the vectors
+    :returns: str -- path of the published directory
+    """
+    words, dim, header = {}, None, False
+    with open(path_vectors, 'rt', encoding='utf-8') as f:
+        for line in f:
+            parts = line.rstrip().split(' ')
+            if dim is None and len(parts) == 2 and parts[0].isdigit():  # word2vec header 'count dim'
+                header = True
+                continue
+            dim = dim or len(parts) - 1
+            words.setdefault(' '.join(parts[:-dim]), len(words))
+
+    path_tmp = staging_dir(path_dir)
+    matrix = np.lib.format.open_memmap(path.join(path_tmp, "vectors.npy"), mode='w+', dtype=dtype,
+                                       shape=(len(words), dim))
+    filled = np.zeros(len(words), dtype=bool)
+    with open(path_vectors, 'rt', encoding='utf-8') as f:
+        if header:
+            next(f)
+        for line in f:
+            parts = line.rstrip().split(' ')
+            row = words[' '.join(parts[:-dim])]
+            if not filled[row]:
+                matrix[row] = np.asarray(parts[-dim:], dtype=dtype)
+                filled[row] = True
+    matrix.flush()
+    del matrix
+    with open(path.join(path_tmp, "vocab.txt"), 'wt', encoding='utf-8') as f:
+        f.writelines(f"{word}\n" for word in words)
+    with open(path.join(path_tmp, embedding_manifest), 'wt') as f:
+        json.dump({"words": len(words), "dim": dim, "source": path.basename(path_vectors)}, f, indent=1)
+    if path.exists(path_dir):
+        shutil.rmtree(path_dir)
+    os.rename(path_tmp, path_dir)
+    return path_dir
+
+
+class Embeddings:
+    """Word vectors converted by :func:`convert_vectors`; the matrix is memory-mapped, so only
+    the rows of words that actually occur get read."""
+
+    def __init__(self, path_dir):
+        self.path_dir = path_dir
+        with open(path.join(path_dir, embedding_manifest)) as f:
+            self.manifest = json.load(f)
+        with open(path.join(path_dir, "vocab.txt"), 'rt', encoding='utf-8') as f:
+            self.words = pd.Index([word.rstrip('\n') for word in f])
+        self.matrix = np.load(path.join(path_dir, "vectors.npy"), mmap_mode='r')
+
+    @property
+    def dim(self):
+        return self.matrix.shape[1]
+
+    def token_ids(self, texts):
+        """Vocabulary rows of the known tokens of every text, flattened
+        :param texts: Sequence of texts
+        :returns: tuple -- (int64 array of rows, int64 array with the number of rows per text)
+        """
+        tokens = [tokenize(text) for text in texts]
+        lengths = np.fromiter(map(len, tokens), dtype=np.int64, count=len(tokens))
+        ids = self.words.get_indexer(list(chain.from_iterable(tokens)))  # one hashed lookup for all tokens
+        known = ids >= 0
+        owner = np.repeat(np.arange(len(texts)), lengths)
+        return ids[known].astype(np.int64), np.bincount(owner[known], minlength=len(texts))
+
+    def embed(self, texts, block_tokens=65536):
+        """Unit-length mean word vector of every text (a zero row when no word is known), the
+        document vector gensim's ``n_similarity`` compares
+        :param texts: Sequence of texts
+        :param block_tokens: Word vectors gathered and summed at once, bounds memory however long a text is
+        :returns: np.ndarray -- float32 matrix, one row per text
+        """
+        ids, counts = self.token_ids(texts)
+        sums = np.zeros((len(texts), self.dim), dtype=np.float32)
+        # read each distinct word once, in file order
+        rows, inverse = np.unique(ids, return_inverse=True)
+        table = np.asarray(self.matrix[rows], dtype=np.float32)
+        inverse = inverse.reshape(-1)
+        owner = np.repeat(np.arange(len(texts)), counts)  # text of every token, texts are consecutive runs
+        for start in range(0, len(ids), block_tokens):
+            block_owner = owner[start:start + block_tokens]
+            firsts = np.flatnonzero(np.r_[True, block_owner[1:] != block_owner[:-1]])
+            # one run per text in the block (a text cut by the block boundary is summed in two parts)
+            sums[block_owner[firsts]] += np.add.reduceat(table[inverse[start:start + block_tokens]], firsts, axis=0)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        return np.divide(sums, norms, out=np.zeros_like(sums), where=norms > 0)
+
+
+def embed_titles(embeddings, texts, path_file=None, chunk_size=20000):
+    """Document vectors of all title summaries, a chunk at a time.  With ``path_file`` the matrix is
+    written there once and memory-mapped on later calls, so scoring another issue skips the embedding.
+    :param embeddings: :class:`Embeddings` to embed with
+    :param texts: Sequence of title summaries
+    :param path_file: Optional .npy cache for the matrix (its name should identify texts and embedding)
+    :param chunk_size: Texts embedded at once (bounds memory for large catalogs)
+    :returns: np.ndarray -- float32 matrix, one unit-length (or zero) row per text
+    """
+    if path_file is not None and path.exists(path_file):
+        return np.load(path_file, mmap_mode='r')
+    if path_file is None:
+        vectors = np.zeros((len(texts), embeddings.dim), dtype=np.float32)
+    else:
+        path_tmp = f"{path_file}.tmp-{os.getpid()}"  # processes embedding the same texts don't share it
+        vectors = np.lib.format.open_memmap(path_tmp, mode='w+', dtype=np.float32,
+                                            shape=(len(texts), embeddings.dim))
+    for start in range(0, len(texts), chunk_size):
+        vectors[start:start + chunk_size] = embeddings.embed(texts[start:start + chunk_size])
+    if path_file is None:
+        return vectors
+    vectors.flush()
+    del vectors
+    os.replace(path_tmp, path_file)
+    return np.load(path_file, mmap_mode='r')
+
+
+def cosine_distances(title_vectors, issue_vectors, chunk_size=20000):
+    """1 - cosine similarity of every title vector to every issue vector, one matrix product per
+    block of titles so a memory-mapped matrix is streamed through once
+    :param title_vectors: Matrix from :func:`embed_titles`
+    :param issue_vectors: Unit-length vectors, one row per issue
+    :param chunk_size: Titles scored at once
+    :returns: np.ndarray -- (titles, issues) distances, NaN where a title has no known word
+    """
+    distances = np.full((len(title_vectors), len(issue_vectors)), np.nan)
+    for start in range(0, len(title_vectors), chunk_size):
+        chunk = np.asarray(title_vectors[start:start + chunk_size])
+        scores = 1.0 - chunk @ issue_vectors.T
+        scores[~chunk.any(axis=1)] = np.nan
+        distances[start:start + chunk_size] = scores
+    return distances
+
+
+def score_titles(embeddings, title_vectors, issues, chunk_size=20000):
+    """Cosine distance (1 - similarity) of every title to every issue description
+    :param embeddings: :class:`Embeddings` to embed the issue descriptions with
+    :param title_vectors: Matrix from :func:`embed_titles`
+    :param issues: dict of issue name -> description text
+    :param chunk_size: Titles scored at once
+    :returns: pd.DataFrame -- one column per issue, one row per title (NaN where a title has no known word)
+    """
+    names = list(issues)
+    issue_vectors = embeddings.embed([issues[name] for name in names])
+    for name, vector in zip(names, issue_vectors):
+        if not vector.any():
+            raise ValueError(f"Issue '{name}' has no words in the embedding vocabulary")
+    return pd.DataFrame(cosine_distances(title_vectors, issue_vectors, chunk_size), columns=names)
+
+
+class TopicSearch:
+    """Scores every title against a free-text topic with an exact blocked search over the
+    title-summary vectors.  Results are kept per normalized query (lower-cased word tokens) in
+    an LRU cache, so a topic many sessions ask for costs one search."""
+
+    def __init__(self, embeddings, title_vectors, cache_size=topic_cache_size, chunk_size=65536):
+        """
+        :param embeddings: :class:`Embeddings` the title vectors were made with
+        :param title_vectors: Matrix from :func:`embed_titles`, one row per catalog title
+        :param cache_size: Topics whose scores are kept
+        :param chunk_size: Titles scored per matrix product
+        """
+        self.embeddings = embeddings
+        self.title_vectors = title_vectors
+        self.cache_size = cache_size
+        self.chunk_size = chunk_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(query):
+        return ' '.join(tokenize(query))
+
+    def distances(self, query):
+        """Distance of every title to a topic, np.inf where a title has no score (as ``load_issue_score``)
+        :param query: Free text describing the topic
+        :returns: np.ndarray -- float32 distances in title order, or None if no word of the topic is known
+        """
+        key = self.normalize(query)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        topic = self.embeddings.embed([key])
+        if not topic.any():
+            return None
+        scores = cosine_distances(self.title_vectors, topic, self.chunk_size)[:, 0].astype(np.float32)
+        scores[np.isnan(scores)] = np.inf
+        scores.flags.writeable = False  # shared by every session asking for the topic
+        with self._lock:
+            self._cache[key] = scores
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return scores
+
+
+def titles_key(texts):
+    """Short checksum of the summary texts, naming their cached vectors"""
+    m = hashlib.md5()
+    for text in texts:
+        m.update(f"{text}\n".encode())
+    return m.hexdigest()[:8]
+
+
+def write_scores(imdb_ids, distances, path_file):
+    """Write one issue's scores as the 'imdb_id,inf_dist_summary' CSV read by ``load_issue_score``,
+    best (smallest) first; titles without a score are left out.  The file is replaced atomically
+    because the app watches it for changes.
+    :param imdb_ids: imdb ids ('tt...') of the titles
+    :param distances: Distance of every title to the issue
+    :param path_file: Destination CSV
+    """
+    scores = pd.DataFrame({'imdb_id': imdb_ids, score_column: distances}).dropna()
+    scores = scores.drop_duplicates('imdb_id').sort_values(score_column, kind='stable')
+    scores.to_csv(f"{path_file}.tmp-{os.getpid()}", index=False)
+    os.replace(f"{path_file}.tmp-{os.getpid()}", path_file)
+
+
+def read_issues(path_issues):
+    """Issue descriptions from a directory of '<Issue name>.txt' files
+    :param path_issues: Directory holding one text file per issue
+    :returns: dict -- issue name -> description
+    """
+    issues = {}
+    for filename in sorted(Path(path_issues).glob('*.txt')):
+        issues[filename.stem] = filename.read_text(encoding='utf-8')
+    return issues
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score title summaries against issue descriptions")
+    commands = parser.add_subparsers(dest='command', required=True)
+    convert = commands.add_parser('convert', help="convert a GloVe/word2vec text file for memory-mapping")
+    convert.add_argument('path_vectors', help="text file with a word and its vector per line")
+    convert.add_argument('path_embedding', help="destination directory")
+    score = commands.add_parser('score', help="write one score CSV per issue description")
+    score.add_argument('path_embedding', help="directory made by the convert command")
+    score.add_argument('path_issues', help="directory with one '<Issue name>.txt' description per issue")
+    score.add_argument('path_output', help="directory for the '<Issue name>.csv' score files")
+    score.add_argument('--titles', default=path.join("..", "data", "app_data.tsv"),
+                       help="title data with 'imdb_id' and 'short_desc' columns")
+    score.add_argument('--chunk-size', type=int, default=20000, help="summaries embedded or scored at once")
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        convert_vectors(args.path_vectors, args.path_embedding)
+        return
+
+    embeddings = Embeddings(args.path_embedding)
+    issues = read_issues(args.path_issues)
+    titles = pd.read_csv(args.titles, sep='\t', usecols=['imdb_id', 'short_desc'])
+    texts = titles['short_desc'].values
+    path_cache = path.join(args.path_embedding, f"titles.{titles_key(texts)}.npy")
+    title_vectors = embed_titles(embeddings, texts, path_cache, args.chunk_size)
+    distances = score_titles(embeddings, title_vectors, issues, args.chunk_size)
+    os.makedirs(args.path_output, exist_ok=True)
+    for name in issues:
+        path_file = path.join(args.path_output, f"{name}.csv")
+        write_scores(titles['imdb_id'].values, distances[name].values, path_file)
+        print(f"Wrote {distances[name].notna().sum()} scores to {path_file}")
+
+
+if __name__ == '__main__':
+    main()
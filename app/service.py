@@ -0,0 +1,256 @@
+# Headless HTTP/JSON recommendation API over the same catalog, filters and ranking as the Streamlit page
+import argparse
+import json
+import math
+import os
+from contextlib import asynccontextmanager
+
+import numpy as np
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+import bundle
+from query import cached_result, count_bits, range_key, select_top_ids, select_titles, result_cache_stats
+from render import display_columns
+from shared import shared_catalog
+
+data_dir_env = "KIDDOS_DATA_DIR"  # data directory for every worker process (default: ../data like the app)
+max_limit = 100  # most titles returned for one issue
+
+
+class RequestError(ValueError):
+    """A request the API can't answer; the message is returned with status 400."""
+
+
+def shared_bundle():
+    """Data bundle shared by every request of this process, reloaded in the background when the data changes"""
+    return shared_catalog("data_bundle", bundle.load_bundle, bundle.data_version).get()
+
+
+def parse_range(name, value):
+    """One range filter from a 'low,high' string or a [low, high] pair (either bound may be empty)
+    :param name: Filter column, one of `bundle.filter_columns`
+    :param value: Bounds of the range
+    :returns: tuple -- (low, high), open bounds are infinite
+    """
+    if name not in bundle.filter_columns:
+        raise RequestError(f"unknown filter '{name}', expected one of {bundle.filter_columns}")
+    if isinstance(value, str):
+        bounds = value.split(',')
+    elif isinstance(value, list) and all(v is None or (isinstance(v, (int, float)) and not isinstance(v, bool))
+                                         for v in value):
+        bounds = value
+    else:
+        raise RequestError(f"filter '{name}' needs a 'low,high' string or a [low, high] list of numbers, got {value!r}")
+    if len(bounds) != 2:
+        raise RequestError(f"filter '{name}' needs two bounds 'low,high', got {value!r}")
+    try:
+        low, high = [float(v) if v not in ('', None) else default for v, default in zip(bounds, (-math.inf, math.inf))]
+    except ValueError:
+        raise RequestError(f"filter '{name}' has a bound that is not a number: {value!r}")
+    if math.isnan(low) or math.isnan(high):
+        raise RequestError(f"filter '{name}' has a bound that is not a number: {value!r}")
+    return low, high
+
+
+def parse_query(params):
+    """Validate the parameters of a title query (query string or JSON body)
+    :param params: Mapping with optional 'issue', 'topic', 'limit' and one entry per range filter
+        (a JSON body may also nest the filters under 'ranges')
+    :returns: dict -- issue, topic, limit and ranges
+    """
+    unknown = set(params) - set(bundle.filter_columns) - {'issue', 'topic', 'limit', 'ranges'}
+    if unknown:
+        raise RequestError(f"unknown parameters {sorted(unknown)}")
+    for name in ('issue', 'topic'):
+        if params.get(name) is not None and not isinstance(params[name], str):
+            raise RequestError(f"{name} must be a string, got {params[name]!r}")
+    ranges = params.get('ranges') or {}
+    if not isinstance(ranges, dict):
+        raise RequestError(f"ranges must be an object of filter -> [low, high], got {ranges!r}")
+    ranges = dict(ranges, **{k: v for k, v in params.items() if k in bundle.filter_columns})
+    try:
+        limit = int(params.get('limit', bundle.issue_titles))
+    except (TypeError, ValueError, OverflowError):
+        raise RequestError(f"limit must be an integer, got {params.get('limit')!r}")
+    if not 0 < limit <= max_limit:
+        raise RequestError(f"limit must be between 1 and {max_limit}")
+    issue, topic = params.get('issue') or None, (params.get('topic') or '').strip() or None
+    if issue and topic:
+        raise RequestError("ask for an issue or a topic, not both")
+    return {'issue': issue, 'topic': topic, 'limit': limit,
+            'ranges': {name: parse_range(name, value) for name, value in ranges.items()}}
+
+
+def title_records(catalog, rows, extra):
+    """JSON text of the display columns of some titles
+    :param catalog: Catalog the rows belong to
+    :param rows: Catalog row positions, in order
+    :param extra: dict of column name -> values (one per row) added to every record
+    :returns: str -- JSON array of title objects
+    """
+    title_df = catalog.frame([c for c in display_columns if c in catalog], rows=rows)
+    for name, values in extra.items():
+        title_df[name] = values
+    return title_df.to_json(orient='records', double_precision=6)
+
+
+def untouched(data, ranges):
+    """Whether filter ranges keep the titles of an untouched sidebar (see `bundle.default_ranges`),
+    so the overview ranked once when the data was loaded answers them."""
+    if data['landing_titles'] is None:
+        return False
+    default = bundle.default_ranges(data['bounds'])
+    if ranges == default:
+        return True
+    if ranges:
+        return False
+    # no filter at all: the same titles when the default ranges keep every title
+    bitset = cached_result(data['catalog'].path_dir, ('bitset', range_key(default)),
+                           lambda: data['index'].select(default))
+    return count_bits(bitset) == data['index'].size
+
+
+def overview_titles(data, ranges):
+    """Best title of every trending issue among the titles matching some filters, in trending order,
+    cached per data version and ranges
+    :param data: Data bundle (see `bundle.load_bundle`)
+    :param ranges: dict of filter column -> (low, high)
+    :returns: list -- (issue, catalog row position) per issue with a title
+    """
+    trending = data['trends'].ranking
+
+    def compute():
+        matched = select_titles(data['listing'], ranges, None, data['index'], bundle.filter_columns)
+        top_rows = bundle.best_titles(matched, trending, data['scores'])
+        return np.array([top_rows.get(bundle.simple_score(issue), -1) for issue in trending], dtype=np.int64)
+
+    rows = cached_result(data['catalog'].path_dir, ('overview', tuple(trending), range_key(ranges)), compute)
+    return [(issue, row) for issue, row in zip(trending, rows.tolist()) if row >= 0]
+
+
+def overview_body(data, top):
+    """JSON response body of the overview from its (issue, catalog row position) pairs"""
+    rows = [row for _, row in top]
+    titles = title_records(data['catalog'], rows, {'issue': [issue for issue, _ in top]})
+    return f'{{"issue": null, "matches": {len(rows)}, "titles": {titles}}}'
+
+
+_landing_body = {}
+
+
+def recommend(data, issue=None, ranges=None, limit=bundle.issue_titles, scores=None):
+    """Ranked titles, exactly as the page lists them: without an issue the best title of every
+    trending issue (in trending order), otherwise the closest titles of the issue.
+
+    Apart from the overview of an untouched sidebar this filters (and may rank) the catalog, so the
+    API runs it in a worker thread.
+
+    :param data: Data bundle (see `bundle.load_bundle`)
+    :param issue: Issue name, None for the trending overview
+    :param ranges: dict of filter column -> (low, high), columns left out are not filtered
+    :param limit: Most titles to return for an issue
+    :param scores: Scores of a typed topic (one per catalog row) to rank by instead of an issue's scores
+    :returns: str -- JSON response body
+    """
+    listing, index, issue_scores, ranges = data['listing'], data['index'], data['scores'], ranges or {}
+    if issue is None and untouched(data, ranges):
+        key = (data['catalog'].path_dir, tuple(data['landing_titles']))
+        if key not in _landing_body:  # the same answer until the data changes
+            _landing_body.clear()
+            _landing_body[key] = overview_body(data, data['landing_titles'])
+        return _landing_body[key]
+    if issue is None:
+        return overview_body(data, overview_titles(data, ranges))
+
+    version = data['catalog'].path_dir
+    if scores is not None:  # typed-topic scores aren't part of the catalog version, so not cached
+        issue_scores, version = bundle.with_scores(issue_scores, issue, scores), None
+    elif bundle.simple_score(issue) not in issue_scores:
+        raise RequestError(f"unknown issue '{issue}'")
+    rows, matches = select_top_ids(listing, ranges, bundle.issue_order(issue), limit, index, bundle.filter_columns,
+                                   version, issue, issue_scores)
+    score = np.asarray(issue_scores[bundle.simple_score(issue)])[rows]
+    titles = title_records(data['catalog'], rows, {'score': np.where(np.isfinite(score), score, np.nan)})
+    return f'{{"issue": {json.dumps(issue)}, "matches": {matches}, "titles": {titles}}}'
+
+
+async def titles(request):
+    """GET (query string) or POST (JSON body) a title query, see `parse_query`"""
+    try:
+        params = dict(request.query_params) if request.method == 'GET' else await request.json()
+        if not isinstance(params, dict):
+            raise RequestError("the body must be a JSON object")
+        query = parse_query(params)
+        data = shared_bundle()
+        scores = None
+        if query['topic'] is not None:
+            if data['topics'] is None:
+                raise RequestError("free-text topics need an embedding in the data directory")
+            # a search over every summary vector takes long enough to stall other requests
+            scores = await run_in_threadpool(data['topics'].distances, query['topic'])
+            if scores is None:
+                raise RequestError(f"none of the words in '{query['topic']}' are known")
+        args = (data, query['topic'] or query['issue'], query['ranges'], query['limit'], scores)
+        if args[1] is None and untouched(data, query['ranges']):  # ranked when the data was loaded
+            body = recommend(*args)
+        else:  # filtering and ranking would stall the other requests
+            body = await run_in_threadpool(recommend, *args)
+    except RequestError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    except json.JSONDecodeError as e:
+        return JSONResponse({'error': f"invalid JSON body ({e})"}, status_code=400)
+    return Response(body, media_type='application/json')
+
+
+async def issues(request):
+    """Issues in trending order, plus the filters a title query accepts"""
+    data = shared_bundle()
+    columns = list(data['scores'])
+    named = [issue for issue in data['trends'].ranking if bundle.simple_score(issue) in columns]
+    return JSONResponse({'trending': data['trends'].ranking,
+                         'issues': named + sorted(c[len('score_'):] for c in set(columns) - set(map(bundle.simple_score, named))),
+                         'topics': data['topics'] is not None,
+                         'filters': bundle.filter_columns})
+
+
+async def health(request):
+    """Data version of this process, the cost of its data loads and the query result cache counters"""
+    stats = shared_catalog("data_bundle", bundle.load_bundle, bundle.data_version).stats()
+    return JSONResponse(dict(stats, result_cache=result_cache_stats()))
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await run_in_threadpool(shared_bundle)  # load before accepting requests, not in the first one
+    yield
+
+
+if os.environ.get(data_dir_env):
+    bundle.use_data_dir(os.environ[data_dir_env])
+
+app = Starlette(routes=[Route('/titles', titles, methods=['GET', 'POST']),
+                        Route('/issues', issues),
+                        Route('/health', health)],
+                lifespan=lifespan)
+
+
+def main():
+    import uvicorn
+    parser = argparse.ArgumentParser(description="Serve title recommendations as JSON over HTTP")
+    parser.add_argument('--host', default='127.0.0.1', help="interface to listen on")
+    parser.add_argument('--port', type=int, default=8000, help="port to listen on")
+    parser.add_argument('--workers', type=int, default=1, help="worker processes (each maps the same catalog)")
+    parser.add_argument('--data-dir', default=None, help=f"data directory (default: ${data_dir_env} or ../data)")
+    args = parser.parse_args()
+    if args.data_dir:  # workers are separate processes, they read it from the environment
+        os.environ[data_dir_env] = os.path.abspath(args.data_dir)
+        bundle.use_data_dir(os.environ[data_dir_env])
+    uvicorn.run('service:app', host=args.host, port=args.port, workers=args.workers,
+                log_level='warning', access_log=False)
+
+
+if __name__ == '__main__':
+    main()
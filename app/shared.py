@@ -0,0 +1,117 @@
+# Process-wide data shared by every Streamlit session
+import threading
+import time
+from types import MappingProxyType
+
+
+class SharedCatalog:
+    """Holds the loaded data for all sessions of a process.
+
+    The first request loads the data (other sessions wait for that single load instead of
+    starting their own).  Afterwards the data fingerprint is re-checked at most every
+    ``check_interval`` seconds; when it changes, one background thread loads the new version
+    while every session keeps getting the old one, which is swapped out once the load finishes.
+    """
+
+    def __init__(self, loader, fingerprint, check_interval=2.0, session_ttl=600.0):
+        """
+        :param loader: Function returning a dict with the loaded data
+        :param fingerprint: Cheap function returning a string that changes with the data on disk
+        :param check_interval: Seconds between fingerprint checks
+        :param session_ttl: Seconds after its last request that a session stops counting as attached
+        """
+        self.loader = loader
+        self.fingerprint = fingerprint
+        self.check_interval = check_interval
+        self.session_ttl = session_ttl
+        self.history = []   # (version, seconds) of every completed load
+        self._value = None
+        self._version = None
+        self._checked = 0.0
+        self._reloading = False
+        self._sessions = {}
+        self._lock = threading.Lock()        # guards the state above
+        self._load_lock = threading.Lock()   # only one load at a time
+
+    def get(self, session_id=None):
+        """Current data as a read-only mapping, loading it first if needed
+        :param session_id: Optional id of the session asking, counted in :meth:`stats`
+        :returns: MappingProxyType -- the loaded data
+        """
+        if session_id is not None:
+            with self._lock:
+                self._sessions[session_id] = time.time()
+        if self._value is None:
+            with self._load_lock:  # everybody else waits for the first load
+                if self._value is None:
+                    version = self.fingerprint()
+                    self._install(version, self._timed_load(version))
+            return self._value
+
+        now = time.time()
+        if now - self._checked > self.check_interval:
+            self._checked = now
+            version = self.fingerprint()
+            if version != self._version:
+                self._start_reload(version)
+        return self._value
+
+    def stats(self):
+        """Attached sessions and the cost of past loads
+        :returns: dict -- version, sessions, loads, last_load_seconds, reloading
+        """
+        now = time.time()
+        with self._lock:
+            self._sessions = {k: v for k, v in self._sessions.items() if now - v < self.session_ttl}
+            return {'version': self._version,
+                    'sessions': len(self._sessions),
+                    'loads': len(self.history),
+                    'last_load_seconds': self.history[-1][1] if self.history else None,
+                    'reloading': self._reloading}
+
+    def _timed_load(self, version):
+        time_start = time.time()
+        value = self.loader()
+        seconds = time.time() - time_start
+        self.history.append((version, seconds))
+        print(f"Loaded data version {version} in {seconds:.2f}s ({self.stats()['sessions']} sessions attached)")
+        return value
+
+    def _install(self, version, value):
+        with self._lock:
+            self._value = MappingProxyType(dict(value))
+            self._version = version
+
+    def _start_reload(self, version):
+        with self._lock:
+            if self._reloading:  # somebody is already on it
+                return
+            self._reloading = True
+        threading.Thread(target=self._reload, args=(version,), daemon=True).start()
+
+    def _reload(self, version):
+        try:
+            with self._load_lock:
+                self._install(version, self._timed_load(version))
+        except Exception as e:   # keep serving the old data, try again on the next check
+            print(f"Warning, loading data version {version} failed ({e}), keeping version {self._version}")
+        finally:
+            with self._lock:
+                self._reloading = False
+
+
+_holders = {}
+_holders_lock = threading.Lock()
+
+
+def shared_catalog(name, loader, fingerprint, **kwargs):
+    """Process-wide :class:`SharedCatalog` for a name, created on first use
+    :param name: Name of the holder (the same name always returns the same holder)
+    :param loader: Function returning a dict with the loaded data
+    :param fingerprint: Cheap function returning a string that changes with the data on disk
+    :returns: SharedCatalog
+    """
+    with _holders_lock:
+        if name not in _holders:
+            _holders[name] = SharedCatalog(loader, fingerprint, **kwargs)
+        return _holders[name]
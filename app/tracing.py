@@ -0,0 +1,167 @@
+# Per-rerun timing spans, Prometheus-style latency histograms and a slow-rerun log
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from os import path
+
+default_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+metrics_file = "metrics.prom"
+slow_log_file = "slow_reruns.jsonl"
+_local = threading.local()   # the trace of the rerun running in this thread
+_null_span = nullcontext()
+
+
+class NullTrace:
+    """Stand-in when tracing is off or no rerun is being traced; every call is a no-op."""
+
+    def span(self, name):
+        return _null_span
+
+    def tag(self, **tags):
+        pass
+
+
+null_trace = NullTrace()
+
+
+def current_trace():
+    """Trace of the rerun running in this thread (:data:`null_trace` if there is none)"""
+    return getattr(_local, 'trace', null_trace)
+
+
+class Trace:
+    """Timings of the stages of one rerun, plus tags describing what the rerun showed."""
+
+    def __init__(self, tags):
+        self.tags = dict(tags)
+        self.stages = {}   # stage name -> total seconds in this rerun
+        self.spans = []    # (stage name, start offset, seconds) in the order they finished
+        self.start = time.perf_counter()
+
+    @contextmanager
+    def span(self, name):
+        """Time a block as stage ``name``; a stage entered several times adds up"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+            self.spans.append((name, start - self.start, seconds))
+
+    def tag(self, **tags):
+        self.tags.update(tags)
+
+
+class Tracer:
+    """Collects rerun traces of a process: per-stage latency histograms written as Prometheus text
+    (e.g. for the node exporter textfile collector) and a JSON-lines log of every rerun slower
+    than ``slow_seconds`` with its full stage breakdown."""
+
+    def __init__(self, path_dir, slow_seconds=1.0, buckets=default_buckets, flush_interval=5.0):
+        """
+        :param path_dir: Directory for the metrics file and the slow-rerun log
+        :param slow_seconds: Reruns taking longer are written to the slow-rerun log
+        :param buckets: Upper bounds (seconds) of the histogram buckets
+        :param flush_interval: Most seconds between rewrites of the metrics file
+        """
+        self.path_dir = path_dir
+        self.slow_seconds = slow_seconds
+        self.buckets = tuple(buckets)
+        self.flush_interval = flush_interval
+        self._histograms = {}   # (metric, labels) -> [count per bucket..., sum, count]
+        self._slow = 0
+        self._flushed = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(path_dir, exist_ok=True)
+
+    @contextmanager
+    def rerun(self, **tags):
+        """Trace one rerun; stages are timed with ``current_trace().span(name)`` anywhere below"""
+        trace = Trace(tags)
+        _local.trace = trace
+        try:
+            yield trace
+        finally:
+            del _local.trace
+            self.record(trace, time.perf_counter() - trace.start)
+
+    def _observe(self, metric, labels, seconds):
+        key = (metric, tuple(sorted(labels.items())))
+        values = self._histograms.get(key)
+        if values is None:
+            values = self._histograms[key] = [0] * len(self.buckets) + [0.0, 0]
+        for idx, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                values[idx] += 1
+        values[-2] += seconds
+        values[-1] += 1
+
+    def record(self, trace, seconds):
+        """Add a finished trace to the histograms, log it if slow and rewrite the metrics if due"""
+        page = str(trace.tags.get('page', 'unknown'))
+        with self._lock:
+            self._observe('kiddos_rerun_seconds', {'page': page}, seconds)
+            for stage, stage_seconds in trace.stages.items():
+                self._observe('kiddos_stage_seconds', {'page': page, 'stage': stage}, stage_seconds)
+            slow = seconds > self.slow_seconds
+            if slow:
+                self._slow += 1
+                with open(path.join(self.path_dir, slow_log_file), 'at') as f:
+                    f.write(json.dumps({'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'seconds': seconds,
+                                        'tags': trace.tags, 'stages': trace.stages,
+                                        'spans': [{'stage': name, 'start': start, 'seconds': span_seconds}
+                                                  for name, start, span_seconds in trace.spans]},
+                                       default=str) + "\n")
+            if slow or time.time() - self._flushed > self.flush_interval:
+                self._flushed = time.time()
+                self._write_metrics()
+
+    def metrics_text(self):
+        """Histograms in the Prometheus text exposition format"""
+        lines = []
+        helps = {'kiddos_rerun_seconds': "Duration of a whole rerun of the page",
+                 'kiddos_stage_seconds': "Time spent in each stage of a rerun"}
+        for metric in sorted({key[0] for key in self._histograms}):
+            lines += [f"# HELP {metric} {helps.get(metric, metric)}", f"# TYPE {metric} histogram"]
+            for (name, labels), values in sorted(self._histograms.items()):
+                if name != metric:
+                    continue
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                for bound, count in zip(self.buckets, values):
+                    lines.append(f'{metric}_bucket{{{label_text},le="{bound}"}} {count}')
+                lines.append(f'{metric}_bucket{{{label_text},le="+Inf"}} {values[-1]}')
+                lines.append(f'{metric}_sum{{{label_text}}} {values[-2]}')
+                lines.append(f'{metric}_count{{{label_text}}} {values[-1]}')
+        lines += ["# HELP kiddos_slow_reruns_total Reruns written to the slow-rerun log",
+                  "# TYPE kiddos_slow_reruns_total counter", f"kiddos_slow_reruns_total {self._slow}"]
+        return "\n".join(lines) + "\n"
+
+    def _write_metrics(self):
+        path_file = path.join(self.path_dir, metrics_file)
+        with open(f"{path_file}.tmp", 'wt') as f:
+            f.write(self.metrics_text())
+        os.replace(f"{path_file}.tmp", path_file)
+
+
+_tracers = {}
+_tracers_lock = threading.Lock()
+
+
+def get_tracer(path_dir, **kwargs):
+    """Process-wide :class:`Tracer` for a directory, created on first use (it has to outlive the
+    reruns, which execute the page script from scratch)
+    :param path_dir: Directory for the metrics file and the slow-rerun log
+    :returns: Tracer
+    """
+    with _tracers_lock:
+        if path_dir not in _tracers:
+            _tracers[path_dir] = Tracer(path_dir, **kwargs)
+        return _tracers[path_dir]
+
+
+def trace_rerun(tracer, **tags):
+    """Context for one rerun: traced by ``tracer``, or a no-op when it is None"""
+    return nullcontext(null_trace) if tracer is None else tracer.rerun(**tags)
@@ -0,0 +1,124 @@
+# Daily trend data per social issue, kept as an append-only date-by-issue array
+import fcntl
+import hashlib
+import io
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from os import path
+
+import numpy as np
+import pandas as pd
+
+trends_manifest = "trends.json"
+trends_format = 1
+chart_column = 'Relative Interest'
+
+
+def csv_rows(text, columns):
+    """Parse CSV rows (no header) into dates and a float32 date-by-issue matrix
+    :param text: CSV lines with a 'Date' column followed by one column per issue
+    :param columns: Header of the CSV
+    :returns: tuple -- (datetime64[D] array, float32 matrix)
+    """
+    df = pd.read_csv(io.StringIO(text), header=None, names=columns)
+    dates = pd.to_datetime(df['Date']).values.astype('datetime64[D]')
+    return dates, df[columns[1:]].values.astype(np.float32)
+
+
+@contextmanager
+def store_lock(path_dir):
+    """Exclusive lock of a trend store (a '.lock' file next to its directory, which a rebuild replaces);
+    every process holds it while it updates or maps the store, so none sees another's rebuild or append"""
+    with open(f"{path_dir}.lock", 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        yield  # released when the file is closed
+
+
+def update_store(path_csv, path_dir):
+    """Bring the trend store in line with the CSV, parsing only the rows added since the last
+    update.  The CSV is expected to grow by appending days; if the part read before changed
+    (checked by hash, which is far cheaper than parsing it again), the store is rebuilt.
+
+    The store keeps dates and values in raw fixed-width files that rows are appended to; the
+    manifest (replaced atomically) says how many rows are valid, so an interrupted append is
+    simply overwritten next time.  Callers hold the :func:`store_lock` of the store.
+
+    :param path_csv: Trend CSV with a 'Date' column and one column per issue
+    :param path_dir: Directory of the store
+    :returns: dict -- the manifest of the updated store
+    """
+    with open(path_csv, 'rb') as f:
+        content = f.read()
+    manifest = None
+    if path.exists(path.join(path_dir, trends_manifest)):
+        with open(path.join(path_dir, trends_manifest)) as f:
+            manifest = json.load(f)
+        if manifest['format'] != trends_format \
+                or hashlib.md5(content[:manifest['offset']]).hexdigest() != manifest['digest']:
+            manifest = None  # not the same file grown by a few days
+    if manifest is None:  # full rebuild
+        if path.exists(path_dir):
+            shutil.rmtree(path_dir)
+        os.makedirs(path_dir)
+        header = content[:content.find(b'\n') + 1]
+        manifest = {'format': trends_format, 'rows': 0, 'offset': len(header),
+                    'issues': pd.read_csv(io.BytesIO(header), nrows=0).columns[1:].tolist()}
+    added = content[manifest['offset']:]
+    lines = added[:added.rfind(b'\n') + 1].decode()  # only complete lines, a day being written waits
+    if not lines.strip():
+        return manifest
+
+    dates, values = csv_rows(lines, ['Date'] + manifest['issues'])
+    rows = manifest['rows']
+    for filename, data in [('dates.bin', dates.astype(np.int64)), ('values.bin', values)]:
+        with open(path.join(path_dir, filename), 'r+b' if rows else 'wb') as f:
+            f.seek(rows * data.itemsize * (data.shape[1] if data.ndim > 1 else 1))
+            f.write(np.ascontiguousarray(data).tobytes())
+            f.truncate()
+    offset = manifest['offset'] + len(lines.encode())
+    manifest.update(rows=rows + len(dates), offset=offset, digest=hashlib.md5(content[:offset]).hexdigest())
+    with open(path.join(path_dir, f"{trends_manifest}.tmp"), 'wt') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(path.join(path_dir, f"{trends_manifest}.tmp"), path.join(path_dir, trends_manifest))
+    return manifest
+
+
+class Trends:
+    """Trend data ready for the landing page: the date-by-issue array, the issues ranked by their
+    latest value and one chart series per issue, all prepared once per data version."""
+
+    def __init__(self, dates, values, issues):
+        """
+        :param dates: datetime64[D] array, one per row
+        :param values: float32 array of shape (dates, issues)
+        :param issues: Issue names, one per column
+        """
+        self.dates = dates
+        self.values = values
+        self.issues = list(issues)
+        latest = len(dates) - 1 - np.argmax(dates[::-1]) if len(dates) else None  # last row of the newest day
+        if latest is None:
+            self.ranking = []
+        else:  # same order (and tie order) as sorting the transposed latest row with pandas
+            self.ranking = pd.Series(values[latest], index=self.issues).sort_values(ascending=False).index.tolist()
+        index = pd.Index(np.datetime_as_string(dates, unit='D'), name='Date')
+        self.charts = {issue: pd.DataFrame({chart_column: values[:, idx]}, index=index)
+                       for idx, issue in enumerate(self.issues)}
+
+
+def load_trends(path_csv, path_dir):
+    """Update the trend store from the CSV (appending new days only) and map it
+    :param path_csv: Trend CSV with a 'Date' column and one column per issue
+    :param path_dir: Directory of the store
+    :returns: Trends
+    """
+    with store_lock(path_dir):  # the mapped rows stay valid once the lock is released, appends go past them
+        manifest = update_store(path_csv, path_dir)
+        rows, issues = manifest['rows'], manifest['issues']
+        if not rows:
+            return Trends(np.zeros(0, dtype='datetime64[D]'), np.zeros((0, len(issues)), dtype=np.float32), issues)
+        dates = np.fromfile(path.join(path_dir, 'dates.bin'), dtype=np.int64, count=rows).astype('datetime64[D]')
+        values = np.memmap(path.join(path_dir, 'values.bin'), dtype=np.float32, mode='r', shape=(rows, len(issues)))
+    return Trends(dates, values, issues)
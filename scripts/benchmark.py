@@ -0,0 +1,235 @@
+# Benchmarks of the app's data path on synthetic catalogs of configurable size
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from os import path
+
+import numpy as np
+import pandas as pd
+import streamlit.config
+import streamlit.logger
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)), '..', 'app'))
+import bundle  # noqa: E402
+import kiddos  # noqa: E402
+import query  # noqa: E402
+import render  # noqa: E402
+
+score_keys = ['Consumerism', 'Drinking, Drugs & Smoking', 'Language', 'Positive Messages',
+              'Positive Role Models & Representations', 'Sex', 'Violence', 'Educational Value', 'Sexy Stuff',
+              'Violence & Scariness']
+issue_names = ['Bullying', 'Civil Rights', 'Civic Engagement', 'Climate Change', 'Gender Equality', 'Gun Control',
+               'Homelessness', 'Immigration', 'LGBTQ+', 'Substance Abuse', 'Sustainability']
+generator_version = 1
+
+
+def synthetic_issues(issues):
+    """Issue names: the real ones first, then numbered ones"""
+    return (issue_names + [f"Issue {idx:03d}" for idx in range(len(issue_names), issues)])[:issues]
+
+
+def generate_catalog(path_root, titles, issues, days=30, coverage=0.9, seed=0):
+    """Write a synthetic 'app_data.tsv', 'trend30.csv' and 'score_data/<issue>.csv' with the layout
+    the app reads.  Nothing is written if the directory already holds the same configuration.
+
+    :param path_root: Data directory to fill
+    :param titles: Number of titles
+    :param issues: Number of issues (each gets a score CSV and a trend column)
+    :param days: Number of trend days
+    :param coverage: Fraction of titles scored for each issue
+    :param seed: Random seed
+    :returns: str -- path_root
+    """
+    config = {'version': generator_version, 'titles': titles, 'issues': issues, 'days': days,
+              'coverage': coverage, 'seed': seed}
+    path_config = path.join(path_root, 'synthetic.json')
+    if path.exists(path_config):
+        with open(path_config) as f:
+            if json.load(f) == config:
+                return path_root
+    if path.exists(path_root):
+        shutil.rmtree(path_root)
+    os.makedirs(path.join(path_root, 'score_data'))
+    rng = np.random.default_rng(seed)
+    ids = pd.Series(np.arange(titles) * 7 + 1000000).astype(str)
+    imdb_ids = 'tt' + ids
+
+    # per-title score dicts as python literals, each name present for 80% of the titles
+    scores = pd.Series('', index=range(titles))
+    for key in score_keys:
+        value = pd.Series(rng.integers(0, 6, titles)).astype(str)
+        scores += np.where(rng.random(titles) < 0.8, f"'{key}': '" + value + "', ", '')
+    scores = '{' + scores.str.rstrip(', ') + '}'
+    scores[rng.random(titles) < 0.01] = np.nan
+    ages = np.array(['age 3+', 'age 8+', 'age 12+', 'age 16+', 'None'])[rng.integers(0, 5, titles)]
+    pd.DataFrame({'imdb_id': imdb_ids,
+                  'title': 'Movie ' + ids,
+                  'release_year': rng.integers(1950, 2021, titles),
+                  'hbogo_url': np.where(rng.random(titles) < 0.3, 'https://play.hbonow.com/feature/' + ids, None),
+                  'short_desc': 'Summary of movie ' + ids + ' about friends, school and family.',
+                  'scores': scores,
+                  'age_child': ages,
+                  'movie_trailer_url': np.where(rng.random(titles) < 0.5, 'https://youtube.com/watch?v=' + ids, None),
+                  'poster': 'https://images.example.com/' + ids + '.jpg'}).to_csv(
+        path.join(path_root, 'app_data.tsv'), sep='\t', index=False)
+
+    names = synthetic_issues(issues)
+    for name in names:
+        scored = rng.random(titles) < coverage
+        pd.DataFrame({'imdb_id': imdb_ids[scored], 'inf_dist_summary': rng.random(scored.sum())}) \
+            .sort_values('inf_dist_summary').to_csv(path.join(path_root, 'score_data', f"{name}.csv"), index=False)
+    trends = pd.DataFrame(rng.integers(0, 100, (days, len(names))), columns=names)
+    trends.insert(0, 'Date', pd.date_range('2019-11-01', periods=days).strftime('%Y-%m-%d'))
+    trends.to_csv(path.join(path_root, 'trend30.csv'), index=False)
+    with open(path_config, 'wt') as f:
+        json.dump(config, f)
+    return path_root
+
+
+def timed(func, repeat, setup=None):
+    """Run a function several times
+    :param func: Function to time
+    :param repeat: Number of runs
+    :param setup: Optional function run (untimed) before every run
+    :returns: dict -- median and min seconds and the number of runs
+    """
+    seconds = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        time_start = time.perf_counter()
+        func()
+        seconds.append(time.perf_counter() - time_start)
+    return {'median': statistics.median(seconds), 'min': min(seconds), 'runs': repeat}
+
+
+def run_suite(path_root, repeat):
+    """Time the data path of the app against one synthetic data directory
+    :param path_root: Data directory made by `generate_catalog`
+    :param repeat: Runs per benchmark
+    :returns: dict -- benchmark name -> timing (see `timed`)
+    """
+    bundle.use_data_dir(path_root)
+
+    def clear_catalogs():
+        for name in os.listdir(path_root):
+            if name.startswith('data_bundle.'):
+                shutil.rmtree(path.join(path_root, name))
+
+    results = {'data_load (cold)': timed(lambda: bundle.data_load("data_bundle", True), repeat, clear_catalogs),
+               'data_load (warm)': timed(lambda: bundle.data_load("data_bundle", True), repeat)}
+
+    catalog = bundle.data_load("data_bundle", True)
+    listing, scores = catalog.frame(bundle.listing_columns(catalog)), catalog.scores
+    results['catalog_index (build)'] = timed(lambda: query.catalog_index(catalog, bundle.filter_columns), repeat,
+                                             query._index_cache.clear)
+    index = query.catalog_index(catalog, bundle.filter_columns)
+    results['draw_sidebar (filter)'] = timed(lambda: kiddos.draw_sidebar(listing, index=index), repeat)
+
+    # the single issue page: filter, then sort by the issue score and the tie-breaks
+    issue_column = bundle.simple_score(issue_names[0])
+    sort_list = [(issue_column, True)] + list(bundle.tie_breaks)
+    results['draw_sidebar (issue sort)'] = timed(
+        lambda: kiddos.draw_sidebar(listing, listing, sort_list, index, scores=scores), repeat)
+    results['draw_sidebar (issue sort, cached)'] = timed(
+        lambda: kiddos.draw_sidebar(listing, listing, sort_list, index, catalog.path_dir, issue_names[0], scores), repeat)
+    results['draw_sidebar (issue top, presorted)'] = timed(
+        lambda: kiddos.draw_sidebar(listing, listing, sort_list, index, catalog.path_dir, issue_names[0], scores,
+                                    bundle.issue_titles), repeat)
+    # untouched sliders on the landing page skip the filter and best-title pick (page prerendered per version)
+    bounds = bundle.filter_bounds(listing)
+    results['draw_sidebar (landing, prerendered)'] = timed(
+        lambda: kiddos.draw_sidebar(listing, index=index, bounds=bounds, untouched=[]), repeat)
+    issue_columns = list(scores)
+    results['best_rows (landing)'] = timed(lambda: query.best_rows(listing, issue_columns, bundle.tie_breaks, scores),
+                                           repeat)
+
+    rows = kiddos.draw_sidebar(listing, listing, sort_list, index, scores=scores).head(bundle.issue_titles).index
+    results['draw_title (cold)'] = timed(lambda: kiddos.draw_title(catalog, rows, "Text"), repeat,
+                                         render._card_cache.clear)
+    results['draw_title (warm)'] = timed(lambda: kiddos.draw_title(catalog, rows, "Text"), repeat)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Ratio of every timing to the baseline run
+    :param results: Benchmark output of this run
+    :param baseline: Benchmark output of an earlier run
+    :param tolerance: Ratio above which a benchmark counts as a regression
+    :returns: dict -- 'config / benchmark' -> {'baseline', 'current', 'ratio', 'regression'}
+    """
+    compared = {}
+    for config, timings in results['results'].items():
+        for name, timing in timings.items():
+            before = baseline['results'].get(config, {}).get(name)
+            if before is None:
+                continue
+            ratio = timing['median'] / max(before['median'], 1e-9)
+            compared[f"{config} / {name}"] = {'baseline': before['median'], 'current': timing['median'],
+                                             'ratio': ratio, 'regression': ratio > tolerance}
+    return compared
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=path.dirname(path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark data loading, filtering, ranking and rendering "
+                                                 "on synthetic catalogs")
+    parser.add_argument('--titles', type=int, nargs='+', default=[10000], help="catalog sizes to run")
+    parser.add_argument('--issues', type=int, nargs='+', default=[12], help="issue counts to run")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per benchmark (the median is reported)")
+    parser.add_argument('--work-dir', default=path.join('/tmp', 'kiddos-bench'),
+                        help="where synthetic data is generated (reused across runs)")
+    parser.add_argument('--output', default='benchmark.json', help="JSON file for the results")
+    parser.add_argument('--baseline', help="earlier results to compare against")
+    parser.add_argument('--tolerance', type=float, default=1.25, help="slowdown ratio reported as a regression")
+    args = parser.parse_args()
+    # streamlit warns about every widget used outside of a session; its log level is reset when
+    # the config is first read, so read it before lowering the level
+    streamlit.config.get_option('logger.level')
+    streamlit.logger.set_log_level('error')
+
+    output = {'meta': {'revision': git_revision(), 'python': platform.python_version(),
+                       'platform': platform.platform(), 'cpus': os.cpu_count(),
+                       'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'repeat': args.repeat},
+              'results': {}}
+    for titles in args.titles:
+        for issues in args.issues:
+            config = f"{titles}x{issues}"
+            path_root = path.join(args.work_dir, config, 'data')
+            time_start = time.perf_counter()
+            generate_catalog(path_root, titles, issues)
+            print(f"{config}: data ready in {time.perf_counter() - time_start:.1f}s")
+            output['results'][config] = run_suite(path_root, args.repeat)
+            for name, timing in output['results'][config].items():
+                print(f"  {name:<28} {timing['median'] * 1000:10.1f} ms  (min {timing['min'] * 1000:.1f} ms)")
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            output['baseline'] = compare(output, json.load(f), args.tolerance)
+        for name, item in output['baseline'].items():
+            flag = 'REGRESSION' if item['regression'] else ''
+            print(f"{name:<45} {item['baseline'] * 1000:10.1f} -> {item['current'] * 1000:10.1f} ms "
+                  f"({item['ratio']:.2f}x) {flag}")
+        status = int(any(item['regression'] for item in output['baseline'].values()))
+    with open(args.output, 'wt') as f:
+        json.dump(output, f, indent=1)
+    print(f"Results written to {args.output}")
+    sys.exit(status)
+
+
+if __name__ == '__main__':
+    main()
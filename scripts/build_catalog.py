@@ -0,0 +1,53 @@
+# Offline build of the title catalog, so app processes only ever map finished catalog versions
+import argparse
+import sys
+import time
+from os import path
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)), '..', 'app'))
+import bundle  # noqa: E402
+from catalog import collect_catalogs  # noqa: E402
+
+
+def build(stem, allow_cache):
+    """Build and publish the catalog for the current inputs
+    :returns: Catalog -- the published version
+    """
+    time_start = time.time()
+    catalog = bundle.build_catalog(stem, allow_cache)
+    print(f"Published {catalog.path_dir} ({len(catalog)} titles, {len(catalog.scores)} issues) "
+          f"in {time.time() - time_start:.1f}s")
+    return catalog
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the title catalog from app_data.tsv and score_data/ and "
+                                                 "publish it for running app processes")
+    parser.add_argument('--data-dir', default=None, help="data directory (default: ../data like the app)")
+    parser.add_argument('--stem', default="data_bundle", help="name of the catalog versions")
+    parser.add_argument('--full', action='store_true', help="parse everything again instead of reusing columns")
+    parser.add_argument('--watch', type=float, default=0, metavar='SECONDS',
+                        help="keep running and rebuild whenever the inputs change, checking this often")
+    parser.add_argument('--keep', type=int, default=bundle.catalog_keep, help="newest versions never removed")
+    parser.add_argument('--grace', type=float, default=bundle.catalog_grace_seconds,
+                        help="seconds a replaced version stays for processes still switching over")
+    args = parser.parse_args()
+    if args.data_dir:
+        bundle.use_data_dir(args.data_dir)
+    bundle.catalog_keep, bundle.catalog_grace_seconds = args.keep, args.grace
+
+    built = None
+    while True:
+        checksum = bundle.data_checksum(bundle.data_sources())
+        if checksum != built:
+            build(args.stem, not args.full)
+            built = checksum
+        else:  # versions replaced a while ago may have run out of their grace period since
+            collect_catalogs(bundle.data_dir, args.stem, args.keep, args.grace)
+        if not args.watch:
+            break
+        time.sleep(args.watch)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,433 @@
+# Polite asynchronous crawler for the review pages, revalidating saved pages instead of downloading them again
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import random
+import time
+import zlib
+from datetime import timezone
+from email.utils import formatdate, parsedate_to_datetime
+from os import path
+from urllib.parse import urljoin, urlsplit
+from urllib.robotparser import RobotFileParser
+
+user_agent = "kiddos-crawler/1.0"
+crawl_manifest = "crawl.manifest.json"  # validators (ETag, Last-Modified) of every saved page, next to the pages
+redirect_codes = {301, 302, 303, 307, 308}
+retry_codes = {429, 500, 502, 503, 504}
+gone_codes = {404, 410}
+conditional_headers = ('If-None-Match', 'If-Modified-Since')  # validators of the url they were stored for
+max_redirects = 5
+max_delay = 60.0  # slowest pacing a host that keeps answering 429/503 is backed off to
+
+
+def read_pages(path_list, base=None):
+    """Pages to crawl from a list file, one 'url [filename ...]' per line (like imdb-urls.txt);
+    urls may be paths on `base` (like movies-list.txt).
+
+    :param path_list: List file, blank lines and lines starting with '#' are ignored
+    :param base: Site the paths are on, e.g. https://www.commonsensemedia.org
+    :returns: list -- (url, filename relative to the output directory)
+    """
+    pages = []
+    with open(path_list, 'rt') as f:
+        for line in f:
+            parts = line.split()
+            if not parts or parts[0].startswith('#'):
+                continue
+            url = urljoin(base, parts[0]) if base and not urlsplit(parts[0]).scheme else parts[0]
+            pages.append((url, page_filename(url, parts[1] if len(parts) > 1 else None)))
+    return pages
+
+
+def page_filename(url, name=None):
+    """File a page is saved to, named like wget -nH -E would (host left out, '.html' added)
+    :param url: Url of the page
+    :param name: Explicit name from the list file
+    :returns: str -- relative path of the file
+    """
+    if name is None:
+        parts = urlsplit(url)
+        name = parts.path.lstrip('/') or 'index'
+        if parts.query:
+            name += f"?{parts.query}"
+    name = path.normpath(name)
+    if name.startswith('..') or path.isabs(name):
+        raise ValueError(f"page file {name!r} of {url} is outside the output directory")
+    return name if name.endswith('.html') else f"{name}.html"
+
+
+def read_crawl_manifest(path_dir):
+    """Validators of the pages saved by earlier crawls
+    :returns: dict -- url -> {'file', 'etag', 'last_modified', 'status', 'checked', 'changed'}
+    """
+    path_manifest = path.join(path_dir, crawl_manifest)
+    if not path.exists(path_manifest):
+        return {}
+    with open(path_manifest, 'rt') as f:
+        return json.load(f)['pages']
+
+
+def write_crawl_manifest(path_dir, pages):
+    with open(path.join(path_dir, f"{crawl_manifest}.tmp"), 'wt') as f:
+        json.dump({'pages': pages}, f)
+    os.replace(path.join(path_dir, f"{crawl_manifest}.tmp"), path.join(path_dir, crawl_manifest))
+
+
+def retry_after(value):
+    """Seconds to wait from a Retry-After header, given as seconds or as an HTTP-date
+    :returns: float -- seconds (0 for a date in the past), None without a usable header
+    """
+    value = (value or '').strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:  # '-0000' dates, which are UTC as well
+        when = when.replace(tzinfo=timezone.utc)
+    return max(when.timestamp() - time.time(), 0.0)
+
+
+async def read_head(reader):
+    """Status line and headers of a response
+    :returns: tuple -- (status code, dict of lower-case header name -> value)
+    """
+    line = await reader.readline()
+    if not line:
+        raise ConnectionResetError("connection closed before the response")
+    status = int(line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            return status, headers
+        name, _, value = line.decode('latin-1').partition(':')
+        name = name.strip().lower()
+        headers[name] = f"{headers[name]}, {value.strip()}" if name in headers else value.strip()
+
+
+async def read_body(reader, status, headers):
+    """Body of a response (chunked, sized or up to the end of the connection), decompressed
+    :returns: tuple -- (body bytes, whether the connection can be used for another request)
+    """
+    keep_alive = headers.get('connection', '').lower() != 'close'
+    if status in (204, 304) or 100 <= status < 200:
+        return b'', keep_alive
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if not size:
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+        while (await reader.readline()) not in (b'\r\n', b'\n', b''):  # trailers
+            pass
+        body = b''.join(chunks)
+    elif 'content-length' in headers:
+        body = await reader.readexactly(int(headers['content-length']))
+    else:
+        body, keep_alive = await reader.read(), False
+    encoding = headers.get('content-encoding', '').lower()
+    if encoding == 'gzip':
+        body = gzip.decompress(body)
+    elif encoding == 'deflate':
+        body = zlib.decompress(body)
+    return body, keep_alive
+
+
+class Host:
+    """Keep-alive connections, concurrency and request pacing of one site"""
+
+    def __init__(self, url, concurrency, delay):
+        """
+        :param url: Any url on the host
+        :param concurrency: Most requests in flight at once
+        :param delay: Seconds between the starts of two requests (randomized 0.5-1.5x like wget --random-wait)
+        """
+        parts = urlsplit(url)
+        self.scheme, self.netloc, self.hostname, self.port = parts.scheme, parts.netloc, parts.hostname, parts.port
+        self.concurrency = concurrency
+        self.delay = delay
+        self.slots = asyncio.Semaphore(concurrency)
+        self.idle = []  # open (reader, writer) pairs
+        self.robots = None
+        self.robots_lock = asyncio.Lock()
+        self._pace_lock = asyncio.Lock()
+        self._next_start = 0.0
+
+    async def pace(self):
+        """Wait until this host may get its next request"""
+        async with self._pace_lock:
+            now = time.monotonic()
+            if self._next_start > now:
+                await asyncio.sleep(self._next_start - now)
+            self._next_start = max(now, self._next_start) + self.delay * random.uniform(0.5, 1.5)
+
+    def back_off(self, seconds=None):
+        """Slow down after the host asked for it (429/503), optionally pausing it for a while"""
+        self.delay = min(max(self.delay * 2, 0.1), max_delay)
+        if seconds:
+            self._next_start = max(self._next_start, time.monotonic() + seconds)
+
+    async def request(self, target, headers, timeout):
+        """One GET over a pooled keep-alive connection; a pooled connection the server already
+        closed is replaced by a new one.
+
+        :param target: Path and query of the url
+        :param headers: Extra request headers
+        :param timeout: Seconds to wait for the connection, the response headers and the body each
+        :returns: tuple -- (status code, response headers, body bytes)
+        """
+        lines = [f"GET {target} HTTP/1.1", f"Host: {self.netloc}", f"User-Agent: {user_agent}",
+                 "Accept-Encoding: gzip", "Connection: keep-alive"] + [f"{k}: {v}" for k, v in headers.items()]
+        message = ("\r\n".join(lines) + "\r\n\r\n").encode('latin-1')
+        while True:
+            pooled = bool(self.idle)
+            reader, writer = self.idle.pop() if pooled else await asyncio.wait_for(self.connect(), timeout)
+            keep_alive = False
+            try:
+                writer.write(message)
+                await writer.drain()
+                status, response_headers = await asyncio.wait_for(read_head(reader), timeout)
+                body, keep_alive = await asyncio.wait_for(read_body(reader, status, response_headers), timeout)
+                return status, response_headers, body
+            except (ConnectionError, asyncio.IncompleteReadError):
+                if not pooled:
+                    raise
+            finally:
+                if keep_alive and len(self.idle) < self.concurrency:
+                    self.idle.append((reader, writer))
+                else:
+                    writer.close()
+
+    async def connect(self):
+        https = self.scheme == 'https'
+        return await asyncio.open_connection(self.hostname, self.port or (443 if https else 80),
+                                             ssl=True if https else None)
+
+    def close(self):
+        for _, writer in self.idle:
+            writer.close()
+        self.idle = []
+
+
+class Crawler:
+    """Fetches pages into a directory with a few polite connections per site.  Pages saved before
+    are revalidated with their ETag / Last-Modified (pages saved by wget, which keeps the server's
+    timestamp, with their mtime), so unchanged pages cost a 304 and are left untouched on disk;
+    that in turn lets ingest.py skip them without even hashing."""
+
+    def __init__(self, path_dir, concurrency=2, delay=1.0, retries=3, timeout=30.0, robots=True, refresh=True):
+        """
+        :param path_dir: Output directory, also holds the crawl manifest and the error log
+        :param concurrency: Most requests in flight per host
+        :param delay: Seconds between request starts per host (a robots.txt Crawl-delay wins if longer)
+        :param retries: Attempts after a failed request, a timeout or a 429/5xx answer
+        :param timeout: Seconds for one request
+        :param robots: Obey the robots.txt of every host
+        :param refresh: Revalidate pages that are already saved (False: only fetch missing pages, like wget -nc)
+        """
+        self.path_dir = path_dir
+        self.concurrency, self.delay, self.retries, self.timeout = concurrency, delay, retries, timeout
+        self.robots, self.refresh = robots, refresh
+        self.manifest = read_crawl_manifest(path_dir)
+        self.hosts = {}
+        self.stats = {'fetched': 0, 'unchanged': 0, 'not_modified': 0, 'gone': 0, 'failed': 0, 'blocked': 0,
+                      'skipped': 0, 'requests': 0, 'bytes': 0}
+
+    def host(self, url):
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        if key not in self.hosts:
+            self.hosts[key] = Host(url, self.concurrency, self.delay)
+        return self.hosts[key]
+
+    async def get(self, url, headers=None):
+        """GET a url, following redirects and retrying failures with back-off; conditional headers
+        are only sent for the url itself, not for the urls it redirects to
+        :returns: tuple -- (status code, response headers, body bytes, url answered); status is None
+            when every attempt failed
+        """
+        headers = headers or {}
+        for _ in range(max_redirects + 1):
+            host, parts = self.host(url), urlsplit(url)
+            target = parts.path or '/'
+            if parts.query:
+                target += f"?{parts.query}"
+            for attempt in range(self.retries + 1):
+                try:
+                    async with host.slots:
+                        await host.pace()
+                        self.stats['requests'] += 1
+                        status, response_headers, body = await host.request(target, headers, self.timeout)
+                except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError, zlib.error) as e:
+                    status, response_headers, body = None, {}, f"{type(e).__name__}: {e}".encode()
+                    pause = None
+                else:
+                    self.stats['bytes'] += len(body)
+                    if status not in retry_codes:
+                        break
+                    pause = retry_after(response_headers.get('retry-after'))
+                    if status in (429, 503):
+                        host.back_off(pause)
+                if attempt < self.retries:
+                    await asyncio.sleep(pause or host.delay * 2 ** attempt)
+            if status not in redirect_codes or 'location' not in response_headers:
+                return status, response_headers, body, url
+            url = urljoin(url, response_headers['location'])
+            headers = {k: v for k, v in headers.items() if k not in conditional_headers}
+        return status, response_headers, body, url
+
+    async def allowed(self, url):
+        """Whether robots.txt of the url's host lets us fetch it (read once per host, a missing file
+        allows everything and an unreachable one nothing, as RFC 9309 asks)"""
+        if not self.robots:
+            return True
+        host = self.host(url)
+        async with host.robots_lock:
+            if host.robots is None:
+                host.robots = RobotFileParser()
+                status, _, body, _ = await self.get(f"{host.scheme}://{host.netloc}/robots.txt")
+                if status == 200:
+                    host.robots.parse(body.decode('utf-8', 'replace').splitlines())
+                    crawl_delay = host.robots.crawl_delay(user_agent)
+                    if crawl_delay:
+                        host.delay = max(host.delay, float(crawl_delay))
+                elif status is not None and 400 <= status < 500:
+                    host.robots.allow_all = True
+                else:
+                    host.robots.disallow_all = True
+        return host.robots.can_fetch(user_agent, url)
+
+    async def fetch_page(self, url, filename, f_err):
+        """Fetch or revalidate one page and save it when its content changed"""
+        path_file = path.join(self.path_dir, filename)
+        entry = self.manifest.get(url, {})
+        exists = path.exists(path_file)
+        if exists and not self.refresh:
+            self.stats['skipped'] += 1
+            return
+        if not await self.allowed(url):
+            self.stats['blocked'] += 1
+            return
+        headers = {}
+        if exists and entry.get('file') == filename:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        elif exists:  # saved by wget, which dates the file with the server's Last-Modified
+            headers['If-Modified-Since'] = formatdate(os.stat(path_file).st_mtime, usegmt=True)
+
+        status, response_headers, body, url_answered = await self.get(url, headers)
+        now = time.time()
+        if status == 304 and exists:
+            self.stats['not_modified'] += 1
+        elif status == 200:
+            old = None
+            if exists:
+                with open(path_file, 'rb') as f:
+                    old = f.read()
+            if body == old:  # no validators honored, but nothing changed either: keep size and mtime for ingest.py
+                self.stats['unchanged'] += 1
+            else:
+                os.makedirs(path.dirname(path_file) or '.', exist_ok=True)
+                with open(f"{path_file}.tmp", 'wb') as f:
+                    f.write(body)
+                os.replace(f"{path_file}.tmp", path_file)
+                self.stats['fetched'] += 1
+                entry['changed'] = now
+            redirected = url_answered != url  # validators of another url, the next crawl starts at this one again
+            entry.update(file=filename, etag=None if redirected else response_headers.get('etag'),
+                         last_modified=None if redirected else response_headers.get('last-modified'))
+        elif status in gone_codes:
+            self.stats['gone'] += 1
+        else:
+            self.stats['failed'] += 1
+            f_err.write(json.dumps({'url': url, 'status': status,
+                                    'error': body[:200].decode('utf-8', 'replace') if status is None else None}) + "\n")
+            return
+        entry.update(status=status, checked=now)
+        self.manifest[url] = entry
+
+    async def crawl(self, pages, report_every=500, save_every=200):
+        """Fetch pages with `concurrency` workers per host, so a slow site doesn't hold up the others
+        :param pages: list of (url, filename) as from `read_pages`
+        :param report_every: Print progress after this many pages
+        :param save_every: Write the crawl manifest after this many pages, so an interrupted crawl keeps its validators
+        :returns: dict -- counts of fetched, unchanged, not_modified, gone, failed, blocked and skipped pages,
+            requests, bytes and elapsed seconds
+        """
+        queues = {}
+        for url, filename in pages:
+            queues.setdefault(self.host(url), []).append((url, filename))
+        for queue in queues.values():  # workers pop from the end
+            queue.reverse()
+        time_start = time.time()
+        handled = [0]
+        os.makedirs(self.path_dir, exist_ok=True)
+
+        with open(path.join(self.path_dir, "crawl.errors"), 'at') as f_err:
+            async def worker(queue):
+                while queue:
+                    url, filename = queue.pop()
+                    await self.fetch_page(url, filename, f_err)
+                    handled[0] += 1
+                    if handled[0] % save_every == 0:
+                        write_crawl_manifest(self.path_dir, self.manifest)
+                    if handled[0] % report_every == 0:
+                        elapsed = time.time() - time_start
+                        print(f"{handled[0]} pages in {elapsed:.1f}s ({handled[0] / elapsed:.1f} pages/s, "
+                              f"{self.stats['fetched']} new or changed)")
+
+            try:
+                await asyncio.gather(*[worker(queue) for host, queue in queues.items()
+                                       for _ in range(host.concurrency)])
+            finally:
+                write_crawl_manifest(self.path_dir, self.manifest)
+                for host in self.hosts.values():
+                    host.close()
+        return dict(self.stats, seconds=time.time() - time_start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch or revalidate review pages for ingest.py")
+    parser.add_argument('path_list', nargs='+', help="url lists, one 'url [filename]' per line")
+    parser.add_argument('--output', required=True, help="directory for the pages (e.g. movies or imdb)")
+    parser.add_argument('--base', default=None, help="site of urls given as paths, e.g. https://www.commonsensemedia.org")
+    parser.add_argument('--per-host', type=int, default=2, help="requests in flight per host")
+    parser.add_argument('--delay', type=float, default=1.0, help="seconds between request starts per host")
+    parser.add_argument('--retries', type=int, default=3, help="attempts after a failure, timeout or 429/5xx")
+    parser.add_argument('--timeout', type=float, default=30.0, help="seconds for one request")
+    parser.add_argument('--new-only', action='store_true', help="only fetch pages not saved yet (like wget -nc)")
+    parser.add_argument('--ignore-robots', action='store_true', help="don't read robots.txt (e.g. for a local test server)")
+    parser.add_argument('--parse', choices=['csm', 'imdb'], help="parse the pages with ingest.py afterwards")
+    parser.add_argument('--records', help="JSON-lines output of the parse (with --parse)")
+    args = parser.parse_args()
+    if args.parse and not args.records:
+        parser.error("--parse needs --records")
+
+    pages = [page for path_list in args.path_list for page in read_pages(path_list, args.base)]
+    crawler = Crawler(args.output, args.per_host, args.delay, args.retries, args.timeout, not args.ignore_robots,
+                      not args.new_only)
+    stats = asyncio.run(crawler.crawl(pages))
+    print(f"Done: {stats['fetched']} new or changed, {stats['not_modified'] + stats['unchanged']} unchanged "
+          f"({stats['not_modified']} by 304), {stats['gone']} gone, {stats['failed']} failed "
+          f"(see {path.join(args.output, 'crawl.errors')}), {stats['blocked']} blocked by robots.txt, "
+          f"{stats['skipped']} skipped; {stats['requests']} requests, {stats['bytes'] / 1e6:.1f} MB "
+          f"in {stats['seconds']:.1f}s")
+
+    if args.parse:
+        from ingest import ingest
+        stats = ingest(args.parse, args.output, args.records)
+        print(f"Parsed {stats['parsed']} pages, {stats['empty']} without details, {stats['failed']} failed, "
+              f"{stats['skipped'] + stats['unchanged']} unchanged, {stats['removed']} removed")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,281 @@
+# Batch ingestion of crawled review pages with the parse_csm / parse_imdb parsers
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from importlib import import_module
+
+parsers = {'csm': 'parse_csm', 'imdb': 'parse_imdb'}
+re_line_head = re.compile(rb'\{"file": ("(?:[^"\\]|\\.)*"), "hash": "([0-9a-f]*)", "version": (-?\d+), ')  # as ingest writes it
+
+
+def file_digest(path_file):
+    """Content hash of a file
+    :param path_file: Path of the file to hash
+    :returns: str -- hex md5 of the file bytes
+    """
+    digest = hashlib.md5()
+    with open(path_file, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def parse_one(parser, path_file, fast=False, known_hash=None):
+    """Hash and parse one saved page in a worker process
+    :param parser: Key of the parser module in `parsers`
+    :param path_file: Path of the html file to parse
+    :param fast: Use the parser's targeted extraction mode
+    :param known_hash: Content hash of the stored record; the page is not parsed again if it still matches
+    :returns: tuple -- (path_file, content hash, status, json text of the record or error message);
+        status is 'parsed', 'empty', 'unchanged' or 'failed'
+    """
+    try:
+        digest = file_digest(path_file)
+        if digest == known_hash:
+            return path_file, digest, 'unchanged', None
+        record = import_module(parsers[parser]).parse_review_file(path_file, fast)
+        # serialize here so only plain text crosses back to the parent process
+        return path_file, digest, 'empty' if record is None else 'parsed', json.dumps(record)
+    except Exception as e:
+        return path_file, None, 'failed', f"{type(e).__name__}: {e}"
+
+
+def line_key(line):
+    """File, content hash and parser version of one output line, read from the head ingest writes
+    first so the record itself isn't parsed (other lines are parsed whole)
+    :returns: tuple -- (file path, content hash, parser version)
+    """
+    match = re_line_head.match(line)
+    if match is not None:
+        return json.loads(match.group(1)), match.group(2).decode(), int(match.group(3))
+    line_info = json.loads(line)
+    return line_info['file'], line_info.get('hash'), line_info.get('version')
+
+
+def read_checkpoint(path_output):
+    """Records already in the output of an earlier run (the last line of a file wins)
+    :param path_output: JSON-lines output of a previous (possibly interrupted) run
+    :returns: tuple -- (dict of file path -> (content hash, parser version, offset of its line), number of lines)
+    """
+    done = {}
+    lines = 0
+    if not os.path.exists(path_output):
+        return done, lines
+    with open(path_output, 'r+b') as f:
+        offset = 0
+        for line in f:
+            if not line.endswith(b'\n'):  # torn last line from an interrupted run
+                break
+            try:
+                path_file, digest, version = line_key(line)
+            except (ValueError, KeyError):
+                break
+            done[path_file] = (digest, version, offset)
+            lines += 1
+            offset += len(line)
+        f.truncate(offset)
+    return done, lines
+
+
+def read_manifest(path_output, parser):
+    """Ingestion manifest of an output file, see `write_manifest`
+    :param path_output: JSON-lines output the manifest belongs to
+    :param parser: Parser the output was made with; a manifest for another parser is ignored
+    :returns: dict -- file path -> {'hash', 'version', 'size', 'mtime'}
+    """
+    path_manifest = f"{path_output}.manifest.json"
+    if not os.path.exists(path_manifest):
+        return {}
+    with open(path_manifest, 'rt') as f:
+        manifest = json.load(f)
+    return manifest['files'] if manifest.get('parser') == parser else {}
+
+
+def write_manifest(path_output, parser, files):
+    """Atomically replace the ingestion manifest: for every page with a record in the output,
+    the content hash and parser version it was parsed at, plus the size and mtime seen when it
+    was hashed (a page whose size and mtime still match is skipped without reading it).
+    :param path_output: JSON-lines output the manifest belongs to
+    :param parser: Parser the output was made with
+    :param files: dict -- file path -> {'hash', 'version', 'size', 'mtime'}
+    """
+    path_manifest = f"{path_output}.manifest.json"
+    with open(f"{path_manifest}.tmp", 'wt') as f:
+        json.dump({'parser': parser, 'files': files}, f)
+    os.replace(f"{path_manifest}.tmp", path_manifest)
+
+
+def compact_output(path_output, keep):
+    """Rewrite the output with only the lines starting at the offsets in `keep`, dropping records
+    that were re-parsed since and records of pages that no longer exist.  The lines are copied in
+    one streaming pass, in the order they were made, without parsing them.
+    :param path_output: JSON-lines output to compact
+    :param keep: Set of offsets of the lines that stay (the last line of every page that still exists)
+    :returns: int -- number of lines dropped
+    """
+    dropped = 0
+    with open(path_output, 'rb') as f, open(f"{path_output}.tmp", 'wb') as f_tmp:
+        offset = 0
+        for line in f:
+            if offset in keep:
+                f_tmp.write(line)
+            else:
+                dropped += 1
+            offset += len(line)
+    os.replace(f"{path_output}.tmp", path_output)
+    return dropped
+
+
+def ingest(parser, path_root, path_output, workers=None, file_ext="html", in_flight=None, report_every=1000,
+           fast=False):
+    """Parse the new and changed pages under a directory over a process pool and append the
+    results to a JSON-lines file as they arrive (one line per file with its content hash and the
+    parser version, 'record' is null when a page had no details).
+
+    The output doubles as the checkpoint: pages whose stored record has the same content hash and
+    parser version are not parsed again, and the manifest next to the output ('<output>.manifest.json')
+    lets pages whose size and mtime are unchanged skip even the hashing.  After a complete run that
+    left superseded lines or records of removed pages, the output is compacted to one line per page
+    that still exists.  Files that raise are logged to '<output>.errors' and retried on the next run.
+
+    :param parser: 'csm' or 'imdb'
+    :param path_root: Directory with the saved html pages
+    :param path_output: JSON-lines file to append to
+    :param workers: Number of worker processes (default: one per core)
+    :param file_ext: Extension of the files to parse
+    :param in_flight: Most files queued at once, bounds memory (default: 4 per worker)
+    :param report_every: Print throughput after this many files
+    :param fast: Use the parsers' targeted extraction mode (see `verify` before relying on it)
+    :returns: dict -- counts of parsed, empty, failed, unchanged, skipped and removed files plus elapsed seconds
+    """
+    module = import_module(parsers[parser])
+    version = module.parser_version
+    workers = workers or os.cpu_count()
+    in_flight = in_flight or 4 * workers
+    done, lines = read_checkpoint(path_output)
+    last = {path_file: offset for path_file, (_, _, offset) in done.items()}  # offset of every page's newest line
+    manifest = read_manifest(path_output, parser)
+    files = {}   # manifest entries of every page that has an up to date record
+    seen = {}    # (size, mtime) of every discovered page, taken before it is hashed
+    stats = {'parsed': 0, 'empty': 0, 'failed': 0, 'unchanged': 0, 'skipped': 0, 'removed': 0}
+    time_start = time.time()
+
+    def pending_files():
+        for path_file in module.discover_files(path_root, file_ext):
+            stat = os.stat(path_file)
+            seen[path_file] = (stat.st_size, stat.st_mtime_ns)
+            known_hash, known_version, _ = done.get(path_file, (None, None, None))
+            if known_version != version:
+                known_hash = None
+            entry = manifest.get(path_file)
+            if known_hash is not None and entry is not None and entry['hash'] == known_hash \
+                    and (entry['size'], entry['mtime']) == seen[path_file]:
+                stats['skipped'] += 1
+                files[path_file] = entry
+            else:
+                yield path_file, known_hash
+
+    with open(path_output, 'ab') as f_out, open(f"{path_output}.errors", 'at') as f_err, \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = pending_files()
+        running = set()
+        while True:
+            # keep a bounded number of files queued instead of submitting the whole corpus
+            for path_file, known_hash in pending:
+                running.add(pool.submit(parse_one, parser, path_file, fast, known_hash))
+                if len(running) >= in_flight:
+                    break
+            if not running:
+                break
+            finished, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                path_file, digest, status, payload = future.result()
+                stats[status] += 1
+                if status == 'failed':
+                    f_err.write(json.dumps({'file': path_file, 'error': payload}) + "\n")
+                    continue
+                size, mtime = seen[path_file]
+                files[path_file] = {'hash': digest, 'version': version, 'size': size, 'mtime': mtime}
+                if status != 'unchanged':
+                    last[path_file] = f_out.tell()
+                    f_out.write(f'{{"file": {json.dumps(path_file)}, "hash": "{digest}", "version": {version}, '
+                                f'"record": {payload}}}\n'.encode())
+                    lines += 1
+                handled = stats['parsed'] + stats['empty'] + stats['failed'] + stats['unchanged']
+                if handled % report_every == 0:
+                    f_out.flush()
+                    elapsed = time.time() - time_start
+                    print(f"{handled} files in {elapsed:.1f}s ({handled / elapsed:.1f} files/s, "
+                          f"{stats['failed']} failed)")
+
+    # the run was complete, so anything not discovered this time is gone from the crawl
+    stats['removed'] = len(set(done) - set(seen))
+    keep = {last[path_file] for path_file in seen if path_file in last}
+    if len(keep) < lines:  # re-parsed pages or removed ones left lines behind; a run that changed nothing skips this
+        compact_output(path_output, keep)
+    write_manifest(path_output, parser, files)
+    stats['seconds'] = time.time() - time_start
+    return stats
+
+
+def verify(parser, path_root, file_ext="html", limit=None):
+    """Differential check of the fast extraction mode: parse every page both ways and
+    report pages where the records differ, plus the time each mode took.
+
+    :param parser: 'csm' or 'imdb'
+    :param path_root: Directory with the saved html pages
+    :param file_ext: Extension of the files to parse
+    :param limit: Stop after this many files
+    :returns: dict -- files compared, mismatching files, seconds for the full and fast parses
+    """
+    module = import_module(parsers[parser])
+    stats = {'files': 0, 'mismatches': [], 'full_seconds': 0.0, 'fast_seconds': 0.0}
+    for path_file in module.discover_files(path_root, file_ext)[:limit]:
+        with open(path_file, 'rt') as f:
+            html_text = f.read()
+        results = {}
+        for mode in ['full', 'fast']:
+            time_start = time.time()
+            try:
+                results[mode] = json.dumps(module.parse_review(html_text, mode == 'fast'), sort_keys=True)
+            except Exception as e:
+                results[mode] = f"{type(e).__name__}: {e}"
+            stats[f'{mode}_seconds'] += time.time() - time_start
+        stats['files'] += 1
+        if results['full'] != results['fast']:
+            stats['mismatches'].append(path_file)
+            print(f"Mismatch {path_file}\n  full: {results['full'][:300]}\n  fast: {results['fast'][:300]}")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parse crawled review pages into a JSON-lines file")
+    parser.add_argument('parser', choices=sorted(parsers), help="which site the pages come from")
+    parser.add_argument('path_root', help="directory with the saved html pages")
+    parser.add_argument('path_output', help="JSON-lines output (reruns only parse new and changed pages)")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument('--ext', default="html", help="extension of the pages to parse")
+    parser.add_argument('--fast', action='store_true', help="use the targeted extraction mode of the parsers")
+    parser.add_argument('--verify', action='store_true',
+                        help="only compare fast and full parsing of every page (nothing is written)")
+    args = parser.parse_args()
+
+    if args.verify:
+        stats = verify(args.parser, args.path_root, args.ext)
+        print(f"{stats['files']} files, {len(stats['mismatches'])} mismatches; full parse {stats['full_seconds']:.1f}s, "
+              f"fast parse {stats['fast_seconds']:.1f}s ({stats['full_seconds'] / max(stats['fast_seconds'], 1e-9):.1f}x)")
+        return
+
+    stats = ingest(args.parser, args.path_root, args.path_output, args.workers, args.ext, fast=args.fast)
+    handled = stats['parsed'] + stats['empty'] + stats['failed'] + stats['unchanged']
+    print(f"Done: {stats['parsed']} parsed, {stats['empty']} without details, {stats['failed']} failed "
+          f"(see {args.path_output}.errors), {stats['skipped'] + stats['unchanged']} unchanged, "
+          f"{stats['removed']} removed; {handled / max(stats['seconds'], 1e-9):.1f} files/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+# Record linkage of parsed CSM reviews and IMDB pages into the app_data.tsv the app loads
+import argparse
+import json
+import re
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from os import path
+
+import pandas as pd
+
+app_columns = ['imdb_id', 'title', 'release_year', 'hbogo_url', 'short_desc', 'scores', 'age_child',
+               'movie_trailer_url', 'poster']  # layout of app_data.tsv (see bundle.build_titles)
+re_imdb_id = re.compile(r"tt\d{7,}")
+re_year = re.compile(r"\b(1[89]\d\d|20\d\d)\b")
+re_title_year = re.compile(r"\s*\((1[89]\d\d|20\d\d)\)\s*$")  # "Title (2016)"
+re_token = re.compile(r"[a-z0-9]+")
+stop_words = {'a', 'an', 'and', 'the', 'of', 'in', 'on', 'to', 'for', 'at'}
+year_slack = 1  # release years may differ by this much (festival vs theatrical release)
+block_tokens = 2  # a title is looked up in the blocks of this many of its rarest tokens
+max_block = 100  # larger (token, year) blocks are only searched for the exact normalized title
+min_similarity = 0.9  # title similarity a fuzzy match needs
+min_margin = 0.05  # lead over the next candidate, closer calls are left unmatched as ambiguous
+
+
+def read_records(path_records):
+    """Parsed records of an ingest.py output (the last line of a page wins, pages without details
+    are left out); a file of plain JSON records per line works too.
+
+    :param path_records: JSON-lines file
+    :returns: list -- record dicts
+    """
+    records = {}
+    with open(path_records, 'rt') as f:
+        for line in f:
+            try:
+                line_info = json.loads(line)
+            except ValueError:  # torn last line of an interrupted run
+                break
+            if 'record' in line_info and 'file' in line_info:
+                records[line_info['file']] = line_info['record']
+            else:
+                records[len(records)] = line_info
+    return [record for record in records.values() if record]
+
+
+def imdb_id(text):
+    """IMDB title id in a url (e.g. http://www.imdb.com/title/tt2948356/?ref_=fn_al), None if there is none"""
+    match = re_imdb_id.search(text or '')
+    return match.group(0) if match else None
+
+
+def release_year(text):
+    """First plausible year in a release field ('2016', '1990-07-18'), None if there is none"""
+    match = re_year.search(str(text or ''))
+    return int(match.group(1)) if match else None
+
+
+def title_tokens(title):
+    """Normalized words of a title: accents, case, punctuation and a trailing '(year)' removed,
+    stop words dropped (unless the title is nothing but stop words)
+
+    :param title: Title as parsed
+    :returns: list -- tokens in title order
+    """
+    text = unicodedata.normalize('NFKD', re_title_year.sub('', title or '')).encode('ascii', 'ignore').decode()
+    tokens = re_token.findall(text.lower().replace('&', ' and '))
+    return [t for t in tokens if t not in stop_words] or tokens
+
+
+class TitleIndex:
+    """IMDB records blocked by (title token, release year), so a title is only compared with the
+    few records sharing a word and a year with it instead of with the whole corpus."""
+
+    def __init__(self, records):
+        """
+        :param records: list of (imdb_id, title, year) tuples
+        """
+        self.titles = []
+        self.blocks = defaultdict(list)
+        self.exact = defaultdict(list)  # (normalized title, year) -> positions
+        self.frequency = Counter()
+        for position, (key, title, year) in enumerate(records):
+            tokens = title_tokens(title)
+            self.titles.append((key, ' '.join(tokens)))
+            self.frequency.update(set(tokens))
+            if year is not None:
+                self.exact[' '.join(tokens), year].append(position)
+                for token in set(tokens):
+                    self.blocks[token, year].append(position)
+
+    def candidates(self, tokens, year):
+        """Positions of the records sharing one of the `block_tokens` rarest tokens of a title and a
+        year (within `year_slack`).  Titles made of common words only ('Love Story') would pull in
+        blocks that grow with the corpus, past `max_block` they are only looked up exactly."""
+        rare = sorted((self.frequency[token], token) for token in set(tokens) if token in self.frequency)
+        found = set()
+        for near in range(year - year_slack, year + year_slack + 1):
+            found.update(self.exact.get((' '.join(tokens), near), ()))
+            for _, token in rare[:block_tokens]:
+                block = self.blocks.get((token, near), ())
+                if len(block) <= max_block:
+                    found.update(block)
+        return found
+
+    def best(self, title, year):
+        """Closest record of a title
+        :param title: Title to look up
+        :param year: Its release year
+        :returns: tuple -- (imdb_id or None, similarity, second best similarity, candidates looked at)
+        """
+        tokens = title_tokens(title)
+        text = ' '.join(tokens)
+        matcher = SequenceMatcher(None, b=text)  # the title is analyzed once, then compared with every candidate
+        floor = min_similarity - min_margin  # candidates below can neither match nor make a match ambiguous
+        scored = []
+        candidates = self.candidates(tokens, year)
+        for position in candidates:
+            key, other_text = self.titles[position]
+            if other_text == text:
+                scored.append((1.0, key))
+                continue
+            if 2.0 * min(len(text), len(other_text)) / (len(text) + len(other_text)) < floor:
+                continue
+            matcher.set_seq1(other_text)
+            if matcher.quick_ratio() < floor:
+                continue
+            scored.append((matcher.ratio(), key))
+        scored.sort(reverse=True)
+        if not scored:
+            return None, 0.0, 0.0, len(candidates)
+        return scored[0][1], scored[0][0], scored[1][0] if len(scored) > 1 else 0.0, len(candidates)
+
+
+def merged_row(csm, imdb, key):
+    """One app_data.tsv row from a CSM record and its IMDB record (None when only the id is known)"""
+    imdb = imdb or {}
+    year = release_year(csm.get('release_year')) or release_year(imdb.get('release'))
+    return {'imdb_id': key,
+            'title': csm.get('title') or imdb.get('title'),
+            'release_year': year,
+            'hbogo_url': None,
+            'short_desc': csm.get('summary') or imdb.get('brief_oneline'),
+            'scores': str(csm['scores']) if csm.get('scores') else None,
+            'age_child': csm.get('age_child'),
+            'movie_trailer_url': None,
+            'poster': csm.get('poster') or imdb.get('poster')}
+
+
+def link_records(csm_records, imdb_records):
+    """Join CSM reviews with IMDB pages: first exactly on the IMDB id a review links to, then the
+    remaining reviews by fuzzy title match within (title token, release year) blocks.  Every IMDB
+    page is used at most once, contested pages go to the most similar review.
+
+    :param csm_records: Records of parse_csm
+    :param imdb_records: Records of parse_imdb
+    :returns: tuple -- (pd.DataFrame of app_data.tsv rows ordered by imdb id, dict of match statistics)
+    """
+    time_start = time.time()
+    imdb_by_id = {}
+    for record in imdb_records:
+        key = imdb_id(record.get('url'))
+        if key is not None:
+            imdb_by_id.setdefault(key, record)
+
+    counts = Counter()
+    linked = {}  # imdb id -> (method, similarity, CSM record)
+    fuzzy = []
+    for record in csm_records:
+        key = imdb_id(record.get('url_imdb'))
+        if key is None:
+            fuzzy.append(record)
+        elif key in linked:
+            counts['duplicates'] += 1
+        else:
+            linked[key] = ('id' if key in imdb_by_id else 'id_without_page', 1.0, record)
+
+    index = TitleIndex([(key, record.get('title'), release_year(record.get('release')))
+                        for key, record in imdb_by_id.items() if key not in linked])
+    proposals = []
+    for record in fuzzy:
+        year = release_year(record.get('release_year'))
+        if year is None:
+            counts['no_year'] += 1
+            continue
+        key, similarity, runner_up, compared = index.best(record.get('title'), year)
+        counts['comparisons'] += compared
+        if key is None or similarity < min_similarity:
+            counts['unmatched'] += 1
+        elif similarity - runner_up < min_margin:
+            counts['ambiguous'] += 1
+        else:
+            proposals.append((similarity, key, record))
+    similarities = []
+    for similarity, key, record in sorted(proposals, key=lambda p: p[0], reverse=True):
+        if key in linked:  # a closer review already took this page
+            counts['unmatched'] += 1
+            continue
+        linked[key] = ('fuzzy', similarity, record)
+        similarities.append(similarity)
+
+    rows = [merged_row(record, imdb_by_id.get(key), key) for key, (_, _, record) in sorted(linked.items())]
+    methods = Counter(method for method, _, _ in linked.values())
+    stats = {'csm_records': len(csm_records), 'imdb_records': len(imdb_records), 'rows': len(rows),
+             'linked_by_id': methods['id'], 'linked_by_id_without_page': methods['id_without_page'],
+             'linked_by_title': methods['fuzzy'], 'unmatched': counts['unmatched'], 'ambiguous': counts['ambiguous'],
+             'no_year': counts['no_year'], 'duplicates': counts['duplicates'],
+             'title_similarity': {q: float(pd.Series(similarities).quantile(q)) for q in (0.05, 0.5)} if similarities else {},
+             'comparisons': counts['comparisons'], 'all_pairs': len(fuzzy) * len(index.titles),
+             'seconds': time.time() - time_start}
+    return pd.DataFrame(rows, columns=app_columns), stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Link parsed CSM and IMDB records into app_data.tsv")
+    parser.add_argument('csm_records', help="ingest.py output of the CSM pages")
+    parser.add_argument('imdb_records', help="ingest.py output of the IMDB pages")
+    parser.add_argument('path_output', help="merged rows, e.g. data/app_data.tsv")
+    args = parser.parse_args()
+
+    title_df, stats = link_records(read_records(args.csm_records), read_records(args.imdb_records))
+    title_df['release_year'] = title_df['release_year'].astype('Int64')
+    title_df.to_csv(args.path_output, sep='\t', index=False)
+    with open(f"{path.splitext(args.path_output)[0]}.linkage.json", 'wt') as f:
+        json.dump(stats, f, indent=1)
+    print(f"{stats['rows']} titles from {stats['csm_records']} reviews: {stats['linked_by_id']} linked by IMDB id "
+          f"({stats['linked_by_id_without_page']} more without an IMDB page), {stats['linked_by_title']} by title "
+          f"and year; {stats['unmatched']} unmatched, {stats['ambiguous']} ambiguous, {stats['no_year']} without "
+          f"a year, {stats['duplicates']} duplicates; {stats['comparisons']} title comparisons instead of "
+          f"{stats['all_pairs']} in {stats['seconds']:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+# Load test of the recommendation API (app/service.py) with many concurrent keep-alive connections
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from os import path
+from urllib.parse import urlencode, urlsplit
+
+path_app = path.join(path.dirname(path.abspath(__file__)), '..', 'app')
+ranges = {'original_release_year': [(1990, 2020), (2000, 2010), (2010, '')],
+          'avg_score': [(2, ''), (3, 5)],
+          'age_number': [('', 8), ('', 12)],
+          'violence_score': [('', 2), ('', 3)],
+          'language_score': [('', 2)],
+          'positive_messages_score': [(3, '')]}
+
+
+def make_queries(issues, count, overview=0.2, seed=0):
+    """Query strings mixing the trending overview and single issues with a few random filters
+    :param issues: Issue names the service knows
+    :param count: Number of distinct queries
+    :param overview: Share of overview queries, half of them without filters (the untouched page)
+    :param seed: Random seed
+    :returns: list -- url paths with query strings
+    """
+    rng = random.Random(seed)
+    queries = []
+    for idx in range(count):
+        params = {}
+        if idx >= count * overview:
+            params['issue'] = rng.choice(issues)
+        elif idx < count * overview / 2:
+            queries.append("/titles")
+            continue
+        for name in rng.sample(sorted(ranges), rng.randint(0 if 'issue' in params else 1, 3)):
+            low, high = rng.choice(ranges[name])
+            params[name] = f"{low},{high}"
+        queries.append(f"/titles?{urlencode(params)}")
+    return queries
+
+
+async def fetch(reader, writer, host, target):
+    """One HTTP/1.1 GET over an open keep-alive connection
+    :returns: tuple -- (status code, body bytes)
+    """
+    writer.write(f"GET {target} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n\r\n".encode())
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode().partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+
+async def client(url, queries, deadline, latencies, errors):
+    """Send queries back to back over one connection until the deadline"""
+    parts = urlsplit(url)
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+    try:
+        while time.perf_counter() < deadline:
+            target = random.choice(queries)
+            time_start = time.perf_counter()
+            status, _ = await fetch(reader, writer, parts.netloc, target)
+            latencies.append(time.perf_counter() - time_start)
+            if status != 200:
+                errors.append((status, target))
+    finally:
+        writer.close()
+
+
+def get_json(url):
+    """Fetch and decode one JSON document (used before the test starts)"""
+    async def run():
+        parts = urlsplit(url)
+        reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+        try:
+            return await fetch(reader, writer, parts.netloc, parts.path)
+        finally:
+            writer.close()
+    status, body = asyncio.run(run())
+    if status != 200:
+        raise RuntimeError(f"{url} returned {status}")
+    return json.loads(body)
+
+
+def load_test(url, connections, seconds, distinct=200, overview=0.2):
+    """Drive the service with concurrent connections for a while
+    :param url: Base url of the service
+    :param connections: Number of concurrent keep-alive connections
+    :param seconds: Length of the test
+    :param distinct: Number of distinct queries to cycle through
+    :param overview: Share of overview queries (see `make_queries`)
+    :returns: dict -- requests, errors, throughput and latency percentiles (ms)
+    """
+    queries = make_queries(get_json(f"{url}/issues")['trending'], distinct, overview)
+    latencies, errors = [], []
+
+    async def run():
+        deadline = time.perf_counter() + seconds
+        await asyncio.gather(*[client(url, queries, deadline, latencies, errors) for _ in range(connections)])
+
+    time_start = time.perf_counter()
+    asyncio.run(run())
+    elapsed = time.perf_counter() - time_start
+    percentiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0.0] * 99
+    return {'connections': connections, 'seconds': elapsed, 'requests': len(latencies), 'errors': len(errors),
+            'requests_per_second': len(latencies) / elapsed,
+            'p50_ms': percentiles[49] * 1000, 'p90_ms': percentiles[89] * 1000, 'p99_ms': percentiles[98] * 1000}
+
+
+def start_service(port, workers, data_dir):
+    """Start a local service and wait until it answers
+    :returns: subprocess.Popen -- the running service
+    """
+    command = [sys.executable, 'service.py', '--port', str(port), '--workers', str(workers)]
+    if data_dir:
+        command += ['--data-dir', path.abspath(data_dir)]
+    process = subprocess.Popen(command, cwd=path_app)
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(600):
+        if process.poll() is not None:
+            raise RuntimeError(f"service exited with status {process.returncode}")
+        try:
+            get_json(f"{url}/health")
+            return process
+        except OSError:
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("service did not come up")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the recommendation API")
+    parser.add_argument('--url', help="base url of a running service (default: start a local one)")
+    parser.add_argument('--port', type=int, default=8765, help="port of the local service")
+    parser.add_argument('--workers', type=int, default=1, help="worker processes of the local service")
+    parser.add_argument('--data-dir', default=None, help="data directory of the local service")
+    parser.add_argument('--connections', type=int, nargs='+', default=[1, 16, 64, 256],
+                        help="concurrent connections, one run per value")
+    parser.add_argument('--seconds', type=float, default=10.0, help="length of every run")
+    parser.add_argument('--overview', type=float, default=0.2,
+                        help="share of trending overview queries, half of them unfiltered")
+    parser.add_argument('--output', help="JSON file for the results")
+    args = parser.parse_args()
+
+    process = None if args.url else start_service(args.port, args.workers, args.data_dir)
+    url = args.url or f"http://127.0.0.1:{args.port}"
+    results = []
+    try:
+        for connections in args.connections:
+            result = load_test(url, connections, args.seconds, overview=args.overview)
+            results.append(result)
+            print(f"{connections:5d} connections: {result['requests_per_second']:8.1f} req/s, "
+                  f"p50 {result['p50_ms']:.1f} ms, p90 {result['p90_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms, "
+                  f"{result['errors']} errors")
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    if args.output:
+        with open(args.output, 'wt') as f:
+            json.dump({'url': url, 'workers': args.workers, 'overview': args.overview, 'cpus': os.cpu_count(), 'results': results}, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
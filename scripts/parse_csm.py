@@ -5,6 +5,18 @@ from bs4 import BeautifulSoup
 import json
 from pprint import pprint
 from pathlib import Path
+import re
+try:
+    import lxml.html
+except ImportError:  # the fast mode needs lxml, the full parse does not
+    lxml = None
+
+parser_version = 1  # bump when parse_review output changes, so ingest.py re-parses stored pages
+re_head_end = re.compile(r'</head\s*>', re.IGNORECASE)
+body_classes = ['field-name-field-product-image', 'user-review-statistics', 'pane-node-field-one-liner',
+                'pane-product-subtitle', 'field-name-field-parents-need-to-know', 'entity-field-collection-item',
+                'field-name-field-family-topics', 'pane-product-details']  # the only body parts parse_review reads
+body_xpath = ' | '.join(f"//div[contains(concat(' ', normalize-space(@class), ' '), ' {v} ')]" for v in body_classes)
 
 def discover_files(path_root, file_ext="html"):
     """Discover html files
@@ -17,26 +29,52 @@ def discover_files(path_root, file_ext="html"):
     return list_files
 
 
-def parse_review_file(path_file):
+def parse_review_file(path_file, fast=False):
     """Parse a movie review from commonsensemedia.org
     
     :param path_file: Absolute path to load/read. 
+    :param fast: Use the targeted extraction in `parse_regions` instead of a full parse
     :returns: dict -- a dictionary or parsed information from the html file
     """
     with open(path_file, 'rt') as f:
-        return parse_review(f.read())
+        return parse_review(f.read(), fast)
+    
     
+def parse_regions(html_text):
+    """Parse only the page regions parse_review reads: the body is parsed by lxml directly and
+    just the matching blocks are handed to BeautifulSoup, so the extraction code stays the same
     
-def parse_review(html_text):
+    :param html_text: Content of a file to be parsed. 
+    :returns: tuple -- (head, body) soups holding just the needed tags, or None if lxml or the head is missing
+    """
+    match = re_head_end.search(html_text) if lxml is not None else None
+    if match is None:
+        return None
+    head = BeautifulSoup(html_text[:match.end()], 'lxml').head
+    found = lxml.html.document_fromstring(html_text[match.end():]).xpath(body_xpath)
+    found_set = set(found)
+    outer = [obj for obj in found if not any(parent in found_set for parent in obj.iterancestors())]  # no nested copies
+    body = BeautifulSoup('<body>' + ''.join(lxml.html.tostring(obj, encoding='unicode', with_tail=False)
+                                            for obj in outer) + '</body>', 'lxml').body
+    return head, body
+
+
+def parse_review(html_text, fast=False):
     """Parse a movie review from commonsensemedia.org
     
     :param html_text: Content of a file to be parsed. 
+    :param fast: Use the targeted extraction in `parse_regions` instead of a full parse
     :returns: dict -- a dictionary or parsed information from the html file
     """
     review_info = {}
-    soup = BeautifulSoup(html_text)
+    regions = parse_regions(html_text) if fast else None
+    if regions is not None:
+        soup_head, soup_body = regions
+    else:
+        soup = BeautifulSoup(html_text)
+        soup_head, soup_body = soup.head, soup.body
 
-    for obj in soup.head.find_all('script', {"type" : "application/ld+json"}):  # special embedded JSON section
+    for obj in soup_head.find_all('script', {"type" : "application/ld+json"}):  # special embedded JSON section
         parsed = json.loads(obj.string)
         review_info['title'] = parsed['name']
         review_info['brief'] = parsed['description']
@@ -46,40 +84,40 @@ def parse_review(html_text):
         if 'itemReviewed' in parsed:
             review_info['url_imdb'] = parsed['itemReviewed']['sameAs']
         # print(parsed)
-    for obj in soup.head.find_all('meta', {'name': "keywords"}):  # keywords
+    for obj in soup_head.find_all('meta', {'name': "keywords"}):  # keywords
         review_info['keywords'] = obj['content'].split(',')
 
-    for obj in soup.body.find_all('div', {'class': "field-name-field-product-image"}):  # poster image
+    for obj in soup_body.find_all('div', {'class': "field-name-field-product-image"}):  # poster image
         subobj = obj.find('img')
         if subobj is not None:
             review_info['poster'] = subobj['src']
 
-    for obj in soup.body.find_all('div', {'class':'user-review-statistics'}):  # ratings by age
+    for obj in soup_body.find_all('div', {'class':'user-review-statistics'}):  # ratings by age
         type_obj = 'adult' if 'adult' in obj.attrs['class'] else 'child'
         subobj = obj.find('div', {'class':'age'})
         if subobj is not None:
             review_info[f'age_{type_obj}'] = obj.find('div', {'class':'age'}).string
             review_info[f'age_{type_obj}_count'] = obj.find('a', {'class':'link-all-user-reviews'}).string
 
-    obj = soup.body.find('div', {'class':'pane-node-field-one-liner'})  # one-line info
+    obj = soup_body.find('div', {'class':'pane-node-field-one-liner'})  # one-line info
     if obj is not None:
         review_info['brief_oneline'] = obj.find('div', {'class':'field-name-field-one-liner'}).string
 
-    for obj in soup.body.find_all('div', {'class':'pane-product-subtitle'}):  # movie info
+    for obj in soup_body.find_all('div', {'class':'pane-product-subtitle'}):  # movie info
         idx = 0
         parts = ['rating', 'release_year', 'duration']
         for subobj in obj.find_all('li'):    
             review_info[parts[idx]] = subobj.string
             idx += 1
 
-    for obj in soup.body.find_all('div', {'class':'field-name-field-parents-need-to-know'}):
+    for obj in soup_body.find_all('div', {'class':'field-name-field-parents-need-to-know'}):
         subobj = obj.find('p')
         if subobj is not None:
             review_info['summary_parents'] = " ".join(subobj.stripped_strings)
 
     review_info['scores'] = {}
     review_info['scores_text'] = {}
-    for obj in soup.body.find_all('div', {'class':'entity-field-collection-item'}):  # critical ratings
+    for obj in soup_body.find_all('div', {'class':'entity-field-collection-item'}):  # critical ratings
         subobj = obj.find('div', {'class':'field-name-field-content-grid-type'})
         if subobj is not None:
             rating = [v for v in obj.find('div', {'class':'content-grid-rating'}).attrs['class'] \
@@ -94,14 +132,14 @@ def parse_review(html_text):
             review_info['scores_text'][subobj.string] = subobj_text.string
 
     review_info['questions'] = []
-    for obj in soup.body.find_all('div', {'class':'field-name-field-family-topics'}):  # discussion topics
+    for obj in soup_body.find_all('div', {'class':'field-name-field-family-topics'}):  # discussion topics
         for subobj in obj.find_all('li'):
             val_test = subobj.strings
             if val_test:
                 review_info['questions'].append(' '.join(subobj.strings).strip())
 
     review_info['details'] = {}
-    obj_details = soup.body.find('div', {'class':'pane-product-details'})
+    obj_details = soup_body.find('div', {'class':'pane-product-details'})
     if obj_details is not None:
         for obj in obj_details.find_all('li'):  # movie details
             rel_val = list(obj.strings)
@@ -5,6 +5,16 @@ from bs4 import BeautifulSoup
 import json
 from pprint import pprint
 from pathlib import Path
+import re
+try:
+    import lxml.html
+except ImportError:  # the fast mode needs lxml, the full parse does not
+    lxml = None
+
+parser_version = 1  # bump when parse_review output changes, so ingest.py re-parses stored pages
+re_head_end = re.compile(r'</head\s*>', re.IGNORECASE)
+body_ids = ['titleDetails']  # the only body parts parse_review reads
+body_xpath = ' | '.join(f"//div[@id='{v}']" for v in body_ids)
 
 def discover_files(path_root, file_ext="html"):
     """Discover html files
@@ -17,28 +27,54 @@ def discover_files(path_root, file_ext="html"):
     return list_files
 
 
-def parse_review_file(path_file):
+def parse_review_file(path_file, fast=False):
     """Parse a movie review from imdb.com
     
     :param path_file: Absolute path to load/read. 
+    :param fast: Use the targeted extraction in `parse_regions` instead of a full parse
     :returns: dict -- a dictionary or parsed information from the html file
     """
     with open(path_file, 'rt') as f:
-        return parse_review(f.read())
+        return parse_review(f.read(), fast)
+    
     
+def parse_regions(html_text):
+    """Parse only the page regions parse_review reads: the body is parsed by lxml directly and
+    just the matching blocks are handed to BeautifulSoup, so the extraction code stays the same
     
-def parse_review(html_text):
+    :param html_text: Content of a file to be parsed. 
+    :returns: tuple -- (head, body) soups holding just the needed tags, or None if lxml or the head is missing
+    """
+    match = re_head_end.search(html_text) if lxml is not None else None
+    if match is None:
+        return None
+    head = BeautifulSoup(html_text[:match.end()], 'lxml').head
+    found = lxml.html.document_fromstring(html_text[match.end():]).xpath(body_xpath)
+    found_set = set(found)
+    outer = [obj for obj in found if not any(parent in found_set for parent in obj.iterancestors())]  # no nested copies
+    body = BeautifulSoup('<body>' + ''.join(lxml.html.tostring(obj, encoding='unicode', with_tail=False)
+                                            for obj in outer) + '</body>', 'lxml').body
+    return head, body
+
+
+def parse_review(html_text, fast=False):
     """Parse a movie review from imdb.com
     
     :param html_text: Content of a file to be parsed. 
+    :param fast: Use the targeted extraction in `parse_regions` instead of a full parse
     :returns: dict -- a dictionary or parsed information from the html file
     """
     review_info = {}
-    soup = BeautifulSoup(html_text)
-    if soup.head is None or soup.body is None:
+    regions = parse_regions(html_text) if fast else None
+    if regions is not None:
+        soup_head, soup_body = regions
+    else:
+        soup = BeautifulSoup(html_text)
+        soup_head, soup_body = soup.head, soup.body
+    if soup_head is None or soup_body is None:
         return None
 
-    for obj in soup.head.find_all('script', {"type" : "application/ld+json"}):  # special embedded JSON section
+    for obj in soup_head.find_all('script', {"type" : "application/ld+json"}):  # special embedded JSON section
         parsed = json.loads(obj.string)
         review_info['title'] = parsed['name']
         review_info['url'] = parsed['url']
@@ -74,7 +110,7 @@ def parse_review(html_text):
                         review_info[type_val].append(subobj['name'])
 
     review_info['details'] = {}
-    for obj in soup.body.find_all('div', {'id': 'titleDetails'}):  # lots of production details
+    for obj in soup_body.find_all('div', {'id': 'titleDetails'}):  # lots of production details
         for subobj in obj.find_all('div', {'class': 'txt-block'}):  
             type_block = ' '.join(subobj.stripped_strings)
             list_str = [v.strip() for v in list(subobj.stripped_strings) if len(v) > 2]
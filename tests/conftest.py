@@ -0,0 +1,6 @@
+# The app and scripts import their sibling modules by name, as when run from their own directory
+import sys
+from os import path
+
+for directory in ("app", "scripts"):
+    sys.path.insert(0, path.join(path.dirname(path.dirname(path.abspath(__file__))), directory))
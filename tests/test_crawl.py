@@ -0,0 +1,183 @@
+# Crawler against a local stand-in HTTP server: revalidation, encodings, redirects, back-off and pacing
+import asyncio
+import gzip
+import os
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from crawl import Crawler, retry_after
+
+last_modified = formatdate(1500000000, usegmt=True)
+
+
+class Site(ThreadingHTTPServer):
+    """Stand-in server: `pages` maps a path to a handler(request, attempt) returning (status, headers, body),
+    every request is logged as (path, headers, monotonic time)"""
+    daemon_threads = True
+
+    def __init__(self, pages):
+        super().__init__(('127.0.0.1', 0), Handler)
+        self.pages, self.log, self.lock = pages, [], threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def requests(self, path):
+        return [headers for p, headers, _ in self.log if p == path]
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive and chunked bodies
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.log.append((self.path, dict(self.headers), time.monotonic()))
+            attempt = len(self.server.requests(self.path))
+        if self.path not in self.server.pages:
+            status, headers, body = 404, {}, b'missing'
+        else:
+            status, headers, body = self.server.pages[self.path](self, attempt)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if headers.get('Transfer-Encoding') == 'chunked':
+            self.end_headers()
+            for start in range(0, len(body), 7):
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(body[start:start + 7]), body[start:start + 7]))
+            self.wfile.write(b'0\r\n\r\n')
+            return
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def site():
+    servers = []
+
+    def start(pages):
+        server = Site(pages)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def crawl(path_dir, pages, delay=0.01, **kwargs):
+    return asyncio.run(Crawler(str(path_dir), delay=delay, timeout=5.0, **kwargs).crawl(pages, report_every=10 ** 6))
+
+
+def etag_page(request, attempt):
+    if request.headers.get('If-None-Match') == '"v1"':
+        return 304, {'ETag': '"v1"'}, b''
+    return 200, {'ETag': '"v1"'}, b'<html>etag</html>'
+
+
+def dated_page(request, attempt):
+    if request.headers.get('If-Modified-Since') == last_modified:
+        return 304, {}, b''
+    return 200, {'Last-Modified': last_modified}, b'<html>dated</html>'
+
+
+def test_fetch_and_revalidate(site, tmp_path):
+    server = site({'/etag': etag_page, '/dated': dated_page})
+    pages = [(f"{server.url}/etag", 'etag.html'), (f"{server.url}/dated", 'dated.html')]
+    stats = crawl(tmp_path, pages, robots=False)
+    assert stats['fetched'] == 2 and stats['failed'] == 0
+    assert (tmp_path / 'etag.html').read_bytes() == b'<html>etag</html>'
+    assert (tmp_path / 'dated.html').read_bytes() == b'<html>dated</html>'
+    mtimes = {name: os.stat(tmp_path / name).st_mtime_ns for name in ('etag.html', 'dated.html')}
+
+    stats = crawl(tmp_path, pages, robots=False)
+    assert stats['not_modified'] == 2 and stats['fetched'] == 0
+    assert server.requests('/etag')[-1]['If-None-Match'] == '"v1"'
+    assert server.requests('/dated')[-1]['If-Modified-Since'] == last_modified
+    assert {name: os.stat(tmp_path / name).st_mtime_ns for name in mtimes} == mtimes
+
+
+def test_wget_file_revalidated_by_mtime(site, tmp_path):
+    server = site({'/dated': dated_page})
+    (tmp_path / 'dated.html').write_bytes(b'<html>dated</html>')
+    os.utime(tmp_path / 'dated.html', (1500000000, 1500000000))
+    stats = crawl(tmp_path, [(f"{server.url}/dated", 'dated.html')], robots=False)
+    assert stats['not_modified'] == 1
+
+
+def test_gzip_and_chunked(site, tmp_path):
+    body = b'<html>' + b'compressed ' * 100 + b'</html>'
+    server = site({
+        '/gzip': lambda request, attempt: (200, {'Content-Encoding': 'gzip'}, gzip.compress(body)),
+        '/chunked': lambda request, attempt: (200, {'Transfer-Encoding': 'chunked'}, body),
+        '/both': lambda request, attempt: (200, {'Transfer-Encoding': 'chunked', 'Content-Encoding': 'gzip'},
+                                           gzip.compress(body)),
+    })
+    stats = crawl(tmp_path, [(f"{server.url}/{name}", f"{name}.html") for name in ('gzip', 'chunked', 'both')],
+                  robots=False)
+    assert stats['fetched'] == 3
+    for name in ('gzip', 'chunked', 'both'):
+        assert (tmp_path / f"{name}.html").read_bytes() == body
+    assert all('gzip' in headers['Accept-Encoding'] for _, headers, _ in server.log)
+
+
+def test_redirect_without_foreign_validators(site, tmp_path):
+    server = site({'/old': lambda request, attempt: (301, {'Location': '/new'}, b''),
+                   '/new': etag_page})
+    pages = [(f"{server.url}/old", 'old.html')]
+    assert crawl(tmp_path, pages, robots=False)['fetched'] == 1
+    assert (tmp_path / 'old.html').read_bytes() == b'<html>etag</html>'
+
+    stats = crawl(tmp_path, pages, robots=False)
+    assert stats['unchanged'] == 1 and stats['failed'] == 0
+    assert all('If-None-Match' not in headers and 'If-Modified-Since' not in headers
+               for headers in server.requests('/old') + server.requests('/new'))
+
+
+@pytest.mark.parametrize('header', ['2', 'date'])
+def test_retry_after(site, tmp_path, header):
+    def busy(request, attempt):
+        if attempt == 1:
+            value = formatdate(time.time() + 3, usegmt=True) if header == 'date' else header
+            return 429, {'Retry-After': value}, b'slow down'
+        return 200, {}, b'<html>ok</html>'
+    server = site({'/busy': busy})
+    stats = crawl(tmp_path, [(f"{server.url}/busy", 'busy.html')], robots=False)
+    assert stats['fetched'] == 1 and stats['requests'] == 2
+    (_, _, first), (_, _, second) = server.log
+    assert second - first >= 1.5
+
+
+def test_retry_after_values():
+    assert retry_after('120') == 120.0
+    assert 58 <= retry_after(formatdate(time.time() + 60, usegmt=True)) <= 60
+    assert retry_after(formatdate(time.time() - 60, usegmt=True)) == 0.0
+    assert retry_after('soon') is None and retry_after(None) is None
+
+
+def test_per_host_pacing(site, tmp_path):
+    pages = {f"/p{i}": (lambda request, attempt: (200, {}, b'<html>page</html>')) for i in range(6)}
+    server = site(pages)
+    stats = crawl(tmp_path, [(f"{server.url}{p}", f"{p[1:]}.html") for p in pages], delay=0.2, concurrency=2,
+                  robots=False)
+    assert stats['fetched'] == 6
+    starts = sorted(t for _, _, t in server.log)
+    assert min(b - a for a, b in zip(starts, starts[1:])) >= 0.09  # delay randomized 0.5-1.5x
+
+
+def test_robots(site, tmp_path):
+    server = site({'/robots.txt': lambda request, attempt: (200, {}, b'User-agent: *\nDisallow: /private\n'),
+                   '/public': lambda request, attempt: (200, {}, b'<html>public</html>'),
+                   '/private': lambda request, attempt: (200, {}, b'<html>private</html>')})
+    stats = crawl(tmp_path, [(f"{server.url}/public", 'public.html'), (f"{server.url}/private", 'private.html')])
+    assert stats['fetched'] == 1 and stats['blocked'] == 1
+    assert not server.requests('/private')
@@ -0,0 +1,56 @@
+# Incremental ingestion: reruns that change nothing leave the output alone, compaction keeps one line per page
+import json
+import shutil
+from pathlib import Path
+
+import pytest
+
+import ingest
+
+path_pages = Path(__file__).parent / "pages" / "csm"
+
+
+def records(path_output):
+    with open(path_output) as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.fixture
+def pages(tmp_path):
+    shutil.copytree(path_pages, tmp_path / "pages")
+    return tmp_path / "pages", str(tmp_path / "out.jsonl")
+
+
+def test_rerun_skips_compaction(pages, monkeypatch):
+    path_root, path_output = pages
+    stats = ingest.ingest('csm', str(path_root), path_output, workers=1)
+    assert (stats['parsed'], stats['empty']) == (2, 1)
+    content = Path(path_output).read_bytes()
+
+    def no_compaction(*args):
+        raise AssertionError("nothing changed, the output should not be rewritten")
+    monkeypatch.setattr(ingest, 'compact_output', no_compaction)
+    stats = ingest.ingest('csm', str(path_root), path_output, workers=1)
+    assert stats['skipped'] == 3 and Path(path_output).read_bytes() == content
+
+
+def test_compaction(pages):
+    path_root, path_output = pages
+    ingest.ingest('csm', str(path_root), path_output, workers=1)
+    with open(path_root / "full.html", 'a') as f:
+        f.write("<!-- changed -->")
+    (path_root / "no_details.html").unlink()
+    with open(path_output, 'a') as f:  # an interrupted run
+        f.write('{"file": "torn')
+    stats = ingest.ingest('csm', str(path_root), path_output, workers=1)
+    assert (stats['parsed'], stats['removed']) == (1, 1)
+    lines = records(path_output)
+    assert sorted(Path(line['file']).name for line in lines) == ['full.html', 'missing_optional.html']
+    assert lines[-1]['file'].endswith('full.html')  # re-parsed pages move to the end, in the order they were made
+    assert lines[-1]['hash'] == ingest.file_digest(str(path_root / "full.html"))
+
+
+def test_line_key():
+    line = ('{"file": "a \\"b\\".html", "hash": "0f", "version": 3, "record": {"file": "x"}}\n').encode()
+    assert ingest.line_key(line) == ('a "b".html', '0f', 3)
+    assert ingest.line_key(b'{"record": null, "version": 1, "hash": "aa", "file": "c.html"}\n') == ('c.html', 'aa', 1)
@@ -0,0 +1,47 @@
+# Differential check of the parsers' fast mode: on every fixture page it must give the same record as a full parse
+import warnings
+from pathlib import Path
+
+import pytest
+
+import parse_csm
+import parse_imdb
+from ingest import verify
+
+path_pages = Path(__file__).parent / "pages"
+modules = {'csm': parse_csm, 'imdb': parse_imdb}
+fixtures = [(site, path_file) for site in modules for path_file in sorted((path_pages / site).glob("*.html"))]
+
+
+@pytest.fixture(autouse=True)
+def quiet():
+    with warnings.catch_warnings():  # the full parse doesn't name a BeautifulSoup parser (as in the notebooks)
+        warnings.simplefilter('ignore')
+        yield
+
+
+@pytest.mark.parametrize('site, path_file', fixtures, ids=[f"{site}-{p.stem}" for site, p in fixtures])
+def test_fast_matches_full(site, path_file):
+    module = modules[site]
+    html_text = path_file.read_text()
+    assert module.parse_regions(html_text) is not None  # the fast mode really took the targeted path
+    assert module.parse_review(html_text, fast=True) == module.parse_review(html_text)
+
+
+def test_fixture_records():
+    full = {(site, p.stem): modules[site].parse_review_file(str(p)) for site, p in fixtures}
+    assert full['csm', 'full']['scores'] == {'Positive Messages': '4', 'Violence & Scariness': '2', 'Language': '1'}
+    assert full['csm', 'full']['url_imdb'] == 'https://www.imdb.com/title/tt1000001/'
+    missing = full['csm', 'missing_optional']
+    assert 'poster' not in missing and 'brief_oneline' not in missing and 'age_child' not in missing
+    assert missing['questions'] == [] and missing['scores_text'] == {}
+    assert full['imdb', 'full']['details']['money_budget'] == '$10,000,000'
+    assert full['imdb', 'missing_optional'] == {'title': 'Movie Two', 'url': '/title/tt1000002/', 'release': '2012-09-01',
+                                                'details': {'production': ['Production Co:', 'Studio C']}}
+    assert full['csm', 'no_details'] is None and full['imdb', 'no_details'] is None
+
+
+@pytest.mark.parametrize('site', sorted(modules))
+def test_verify(site):
+    stats = verify(site, str(path_pages / site))
+    assert stats['files'] == 3 and stats['mismatches'] == []
@@ -0,0 +1,78 @@
+# Request validation of the recommendation API: malformed queries are answered with 400, not 500
+import asyncio
+import json
+import math
+
+import pytest
+
+import service
+
+
+def call(method, query='', body=None):
+    """Send one request to the ASGI app without a server
+    :returns: tuple -- (status code, decoded JSON body)
+    """
+    messages = [{'type': 'http.request', 'body': b'' if body is None else body.encode(), 'more_body': False}]
+    scope = {'type': 'http', 'http_version': '1.1', 'method': method, 'scheme': 'http', 'path': '/titles',
+             'raw_path': b'/titles', 'root_path': '', 'query_string': query.encode(), 'server': ('test', 80),
+             'client': ('test', 1), 'headers': [(b'content-type', b'application/json')]}
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(service.app(scope, receive, send))
+    return sent[0]['status'], json.loads(b''.join(m.get('body', b'') for m in sent[1:]))
+
+
+@pytest.mark.parametrize('query', [
+    'ranges=x',
+    'avg_score=3',
+    'avg_score=a,b',
+    'avg_score=nan,4',
+    'limit=0',
+    'limit=many',
+    'colour=red',
+])
+def test_malformed_query_string(query):
+    status, body = call('GET', query)
+    assert status == 400 and 'error' in body
+
+
+@pytest.mark.parametrize('body', [
+    '[1, 2]',
+    '{"ranges": [1]}',
+    '{"ranges": "avg_score"}',
+    '{"ranges": {"avg_score": 5}}',
+    '{"ranges": {"avg_score": [1]}}',
+    '{"ranges": {"avg_score": [1, 2, 3]}}',
+    '{"ranges": {"avg_score": ["1", "2"]}}',
+    '{"ranges": {"avg_score": [true, 4]}}',
+    '{"ranges": {"avg_score": {"low": 1}}}',
+    '{"ranges": {"shoe_size": [1, 2]}}',
+    '{"avg_score": 5}',
+    '{"issue": ["Bullying"]}',
+    '{"issue": 3}',
+    '{"topic": {"text": "school"}}',
+    '{"issue": "Bullying", "topic": "school"}',
+    '{"limit": [10]}',
+    '{"limit": 1e999}',
+    '{"limit": 1000}',
+    '{"ranges": ',
+])
+def test_malformed_body(body):
+    status, response = call('POST', body=body)
+    assert status == 400 and 'error' in response
+
+
+def test_parse_query():
+    query = service.parse_query({'issue': 'Bullying', 'limit': '5', 'avg_score': '2,', 'ranges': {
+        'age_number': [None, 8], 'original_release_year': [1990, 2010.5]}})
+    assert query == {'issue': 'Bullying', 'topic': None, 'limit': 5,
+                     'ranges': {'avg_score': (2.0, math.inf), 'age_number': (-math.inf, 8.0),
+                                'original_release_year': (1990.0, 2010.5)}}
+    assert service.parse_query({'topic': '  kids at school ', 'issue': ''})['topic'] == 'kids at school'
+    assert service.parse_query({})['ranges'] == {}